@@ -0,0 +1,60 @@
+class AccessRegistry:
+    # Per-variable registry of the transactions that read (or wrote) it, with the time of their first access.
+    def __init__(self):
+        self.accesses = {} # Dict of variable id to dict of transaction id to first access time
+        self.variables_by_transaction = {} # Dict of transaction id to the set of variable ids it accessed
+        self.changes = None # (transaction id, variable id or None for a removal, time) log while a replica follows us
+
+    def record(self, variable, transaction_id, time):
+        # Only the first access of a transaction is kept, so insertion order is also time order
+        entries = self.accesses.setdefault(variable, {})
+        if transaction_id not in entries:
+            entries[transaction_id] = time
+            self.variables_by_transaction.setdefault(transaction_id, set()).add(variable)
+            if self.changes is not None:
+                self.changes.append((transaction_id, variable, time))
+
+    def accessors(self, variable):
+        # (transaction id, first access time) pairs for variable, oldest first
+        return self.accesses.get(variable, {}).items()
+
+    def remove(self, transaction_id):
+        # Drops every record of transaction_id, touching only the variables it accessed
+        variables = self.variables_by_transaction.pop(transaction_id, None)
+        if variables is None:
+            return
+        for variable in variables:
+            entries = self.accesses[variable]
+            del entries[transaction_id]
+            if not entries:
+                del self.accesses[variable]
+        if self.changes is not None:
+            self.changes.append((transaction_id, None, None))
+
+    def follow(self):
+        # Starts logging changes for a replica and returns the changes that build one from scratch
+        self.changes = []
+        return [(transaction_id, variable, time)
+                for variable, entries in self.accesses.items() for transaction_id, time in entries.items()]
+
+    def take_changes(self):
+        # Changes logged since the last call
+        changes, self.changes = self.changes, []
+        return changes
+
+    def unfollow(self):
+        self.changes = None
+
+    def replay(self, changes):
+        # Applies changes logged by another registry, keeping its order of accessors
+        for transaction_id, variable, time in changes:
+            if variable is None:
+                self.remove(transaction_id)
+            else:
+                self.record(variable, transaction_id, time)
+
+    def __contains__(self, variable):
+        return variable in self.accesses
+
+    def __repr__(self):
+        return f"AccessRegistry({self.accesses})"
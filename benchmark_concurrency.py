@@ -0,0 +1,58 @@
+import argparse
+import os
+
+from concurrency_control import CONCURRENCY_CONTROLS
+from events import NullSink
+from transaction_manager import TransactionManager
+
+
+def replay(path, tm):
+    # Same handling of comments and blank lines as main.process_input, without echoing the commands
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('//'):
+                tm.time += 1
+                continue
+            tm.process_command(line)
+    tm.flush_commits()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput, latency and abort rate of each concurrency control on the same scripts")
+    parser.add_argument("paths", nargs="*", default=["./inputs"], help="input files or folders of .txt files")
+    parser.add_argument("--concurrency", nargs="+", choices=sorted(CONCURRENCY_CONTROLS), default=["si", "ssi", "2pl", "occ"])
+    parser.add_argument("--ssi-mode", choices=TransactionManager.SSI_MODES, default="graph")
+    parser.add_argument("--repeat", type=int, default=1, help="times to replay every script")
+    args = parser.parse_args()
+
+    scripts = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            scripts.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.txt'))
+        else:
+            scripts.append(path)
+
+    print(f"{len(scripts)} scripts x {args.repeat}")
+    print(f"{'strategy':>8} {'commits':>8} {'aborts':>7} {'abort rate':>11} {'commits/s':>10} {'latency (ticks)':>16} {'latency (us)':>13}")
+    for name in args.concurrency:
+        commits = aborts = 0
+        elapsed = latency_ticks = latency_seconds = 0.0
+        for _ in range(args.repeat):
+            for script in scripts:
+                # Output is fully disabled, so the numbers measure the manager alone
+                tm = TransactionManager(ssi_mode=args.ssi_mode, concurrency=name, events=NullSink())
+                replay(script, tm)
+                commits += tm.stats.commits
+                aborts += tm.stats.aborts
+                elapsed += tm.stats.elapsed()
+                latency_ticks += tm.stats.latency_ticks
+                latency_seconds += tm.stats.latency_seconds
+        finished = commits + aborts
+        print(f"{name:>8} {commits:>8} {aborts:>7} {aborts / finished if finished else 0:>11.1%} "
+              f"{commits / elapsed if elapsed else 0:>10.0f} {latency_ticks / commits if commits else 0:>16.2f} "
+              f"{latency_seconds / commits * 1e6 if commits else 0:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import os
+import time
+
+from events import NullSink
+from topology import Topology
+from transaction_manager import TransactionManager
+from validation import ValidationScheduler
+
+
+def build_batch(validator, transactions, writes, readers):
+    """
+    Sets up a manager with a group commit batch of `transactions` writers with disjoint write sets.
+
+    Each written variable was first read by `readers` long-running transactions, so collecting the
+    graph edges of a writer visits readers * writes registry entries.
+
+    Returns:
+        tuple: (TransactionManager, list of the pending Transaction objects)
+    """
+    num_variables = transactions * writes
+    tm = TransactionManager(topology=Topology(num_sites=4, num_variables=num_variables, replication="single"),
+                            group_commit=transactions + 1, validator=validator, events=NullSink())
+    for r in range(readers):
+        reader = tm.symbols.transaction(f"R{r}")
+        tm.begin_transaction(reader)
+        for var in range(1, num_variables + 1):
+            tm.read(reader, var)
+    for t in range(transactions):
+        writer = tm.symbols.transaction(f"T{t}")
+        tm.begin_transaction(writer)
+        for var in range(t * writes + 1, (t + 1) * writes + 1):
+            tm.write(writer, var, t)
+        tm.time += 1
+        tm.end_transaction(writer, tm.sites)
+    return tm, list(tm.commit_batch)
+
+
+def run(executor, workers, args):
+    validator = ValidationScheduler(workers, executor) if workers else None
+    # Validation phase alone, then a whole flush on a fresh manager
+    tm, batch = build_batch(validator, args.transactions, args.writes, args.readers)
+    if validator is not None:
+        validator.validate(batch, tm) # validation has no side effects, so this only starts the pool and the replicas
+    start = time.perf_counter()
+    if validator is not None:
+        validator.validate(batch, tm)
+    else:
+        for transaction in batch:
+            transaction.check_first_committer()
+            list(transaction.graph_edges())
+    validate_seconds = time.perf_counter() - start
+
+    tm, batch = build_batch(validator, args.transactions, args.writes, args.readers)
+    # Process replicas get the registries of a new manager once, so a long run pays for it on its first flush only.
+    # Timed here as a first validation of the batch, which has no side effects.
+    first_seconds = None
+    if validator is not None:
+        start = time.perf_counter()
+        validator.validate(batch, tm)
+        first_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    tm.flush_commits()
+    flush_seconds = time.perf_counter() - start
+    if validator is not None:
+        validator.close()
+    return first_seconds, validate_seconds, flush_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling of parallel group commit validation with the number of workers")
+    parser.add_argument("--transactions", type=int, default=200, help="transactions in the group commit batch")
+    parser.add_argument("--writes", type=int, default=20, help="variables written by each transaction")
+    parser.add_argument("--readers", type=int, default=50, help="earlier readers of every written variable")
+    parser.add_argument("--executor", choices=sorted(ValidationScheduler.EXECUTORS), default="process")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{args.transactions} transactions x {args.writes} writes, {args.readers} readers per variable, "
+          f"{args.executor} pool, {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'first (s)':>10} {'validate (s)':>13} {'speedup':>8} {'flush (s)':>10} {'speedup':>8}")
+    baseline = None
+    workers = 0 # serial validation without a scheduler
+    while workers <= args.max_workers:
+        first_seconds, validate_seconds, flush_seconds = run(args.executor, workers, args)
+        if baseline is None:
+            baseline = (validate_seconds, flush_seconds)
+        label = workers if workers else "serial"
+        first = f"{first_seconds:.3f}" if first_seconds is not None else "-"
+        print(f"{label:>8} {first:>10} {validate_seconds:>13.3f} {baseline[0] / validate_seconds:>8.2f} "
+              f"{flush_seconds:>10.3f} {baseline[1] / flush_seconds:>8.2f}")
+        workers = workers * 2 if workers else 1
+
+
+if __name__ == '__main__':
+    main()
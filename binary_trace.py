@@ -0,0 +1,264 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+
+from commands import BEGIN, READ, WRITE, END, DUMP, FAIL, RECOVER, ERROR, Command, CommandParser
+from symbols import SymbolTable
+
+# A trace file is a header, fixed-width records in command order, then a JSON table of the names the
+# records refer to by index: transaction names, malformed variable names and error messages.
+MAGIC = b"SSITRACE"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQ") # magic, version, record size, record count, name table offset
+# opcode, 3 padding bytes, transaction id (-1 if none), variable id, value, tick
+RECORD = struct.Struct("<B3xiiqQ")
+
+# value of a BEGIN record
+READ_WRITE = 0
+READ_ONLY = 1
+READ_ONLY_DEFERRABLE = 2
+
+
+def encode(command, tick, messages):
+    # Record for a compiled Command run at tick. ERROR messages are appended to messages and referred to by index.
+    opcode, args = command.opcode, command.args
+    transaction = variable = value = 0
+    if opcode == BEGIN:
+        transaction = args[0]
+        if len(args) == 3 and args[1]:
+            value = READ_ONLY_DEFERRABLE if args[2] else READ_ONLY
+    elif opcode in (READ, END):
+        transaction = args[0]
+        if opcode == READ:
+            variable = args[1]
+    elif opcode == WRITE:
+        transaction, variable, value = args
+    elif opcode in (FAIL, RECOVER):
+        value = args[0]
+    elif opcode == ERROR:
+        value = len(messages)
+        messages.append(args[0])
+    if opcode in (DUMP, FAIL, RECOVER, ERROR):
+        transaction = -1
+    try:
+        return RECORD.pack(opcode, transaction, variable, value, tick)
+    except struct.error:
+        raise ValueError(f"Command does not fit in a trace record: {command!r} at tick {tick}")
+
+
+def decode(opcode, transaction, variable, value, messages):
+    # Command of a record, the inverse of encode
+    if opcode == BEGIN:
+        if value == READ_WRITE:
+            return Command(BEGIN, (transaction,))
+        return Command(BEGIN, (transaction, True, value == READ_ONLY_DEFERRABLE))
+    if opcode == READ:
+        return Command(READ, (transaction, variable))
+    if opcode == WRITE:
+        return Command(WRITE, (transaction, variable, value))
+    if opcode == END:
+        return Command(END, (transaction,))
+    if opcode == DUMP:
+        return Command(DUMP)
+    if opcode in (FAIL, RECOVER):
+        return Command(opcode, (value,))
+    if opcode == ERROR:
+        return Command(ERROR, (messages[value],))
+    raise ValueError(f"Unknown opcode in trace record: {opcode}")
+
+
+def convert(input_path, output_path):
+    """
+    Compiles a .txt script to a binary trace.
+
+    Ticks follow main.process_stream: every line, blank and comment lines included, advances the time
+    by one, so replaying the trace gives each command the same time as running the script.
+
+    Args:
+        input_path (str): The script to convert.
+        output_path (str): The trace file to write.
+
+    Returns:
+        int: Number of records written.
+    """
+    symbols = SymbolTable()
+    parser = CommandParser(symbols)
+    messages = []
+    count = 0
+    tick = 0
+    with open(input_path, 'r') as source, open(output_path, 'wb') as trace:
+        trace.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0, 0))
+        chunk = []
+        for line in source:
+            line = line.strip()
+            if not line or line.startswith('//'):
+                tick += 1
+                continue
+            command = parser.parse(line)
+            if command is None:
+                continue
+            tick += 1
+            chunk.append(encode(command, tick, messages))
+            count += 1
+            if len(chunk) >= 4096:
+                trace.write(b"".join(chunk))
+                chunk.clear()
+        trace.write(b"".join(chunk))
+        names_offset = trace.tell()
+        trace.write(json.dumps({
+            "transactions": symbols.transaction_names,
+            "variables": symbols.unknown_variable_names,
+            "messages": messages,
+        }).encode())
+        trace.seek(0)
+        trace.write(HEADER.pack(MAGIC, VERSION, RECORD.size, count, names_offset))
+    return count
+
+
+class TraceReader:
+    """
+    Memory-mapped reader of a binary trace.
+
+    Records are unpacked straight from the mapping, so a trace is never read into memory as a whole
+    and the text parser is skipped entirely on replay.
+
+    Args:
+        path (str): The trace file.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map.size() < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a trace file")
+        magic, version, record_size, self.count, names_offset = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} trace file")
+        names = json.loads(self.map[names_offset:].decode())
+        self.transaction_names = names["transactions"]
+        self.variable_names = names["variables"]
+        self.messages = names["messages"]
+
+    def load_symbols(self, symbols):
+        # Interns the trace's names in symbols so that they get the ids the records use
+        for transaction_id, name in enumerate(self.transaction_names):
+            if symbols.transaction(name) != transaction_id:
+                raise ValueError(f"{self.path} needs a fresh symbol table, {name} already has another id")
+        for index, name in enumerate(self.variable_names):
+            if symbols.variable(name) != -index - 1:
+                raise ValueError(f"{self.path} needs a fresh symbol table, {name} already has another id")
+
+    def records(self, chunk_records=65536):
+        # (opcode, transaction, variable, value, tick) tuples in trace order. Records are unpacked a
+        # chunk at a time from a copy of the mapped pages, so no buffer of the mapping outlives the loop.
+        end = HEADER.size + self.count * RECORD.size
+        step = chunk_records * RECORD.size
+        for start in range(HEADER.size, end, step):
+            yield from RECORD.iter_unpack(self.map[start:min(start + step, end)])
+
+    def __iter__(self):
+        # (tick, Command) pairs in trace order
+        messages = self.messages
+        for opcode, transaction, variable, value, tick in self.records():
+            yield tick, decode(opcode, transaction, variable, value, messages)
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def format_command(command, symbols):
+    # Text form of a compiled command, as it would appear in a script
+    opcode, args = command.opcode, command.args
+    if opcode == BEGIN:
+        name = symbols.transaction_name(args[0])
+        if len(args) == 3 and args[1]:
+            return f"beginRO({name}, deferrable)" if args[2] else f"beginRO({name})"
+        return f"begin({name})"
+    if opcode == READ:
+        return f"R({symbols.transaction_name(args[0])}, {symbols.variable_name(args[1])})"
+    if opcode == WRITE:
+        return f"W({symbols.transaction_name(args[0])}, {symbols.variable_name(args[1])}, {args[2]})"
+    if opcode == END:
+        return f"end({symbols.transaction_name(args[0])})"
+    if opcode == DUMP:
+        return "dump()"
+    if opcode == FAIL:
+        return f"fail({args[0]})"
+    if opcode == RECOVER:
+        return f"recover({args[0]})"
+    return args[0]
+
+
+def replay(path, tm=None, echo=False):
+    """
+    Runs a binary trace on a TransactionManager.
+
+    Each record sets the manager's time to its tick and is dispatched through TransactionManager.execute,
+    so the output matches running the original script, minus the echoed command lines unless echo is set.
+
+    Args:
+        path (str): The trace file.
+        tm (TransactionManager): Manager with a fresh symbol table, a new one by default.
+        echo (bool): Print each command as "> command" before running it, like main.process_stream.
+
+    Returns:
+        TransactionManager: The manager the trace ran on.
+    """
+    if tm is None:
+        from transaction_manager import TransactionManager
+        tm = TransactionManager()
+    with TraceReader(path) as reader:
+        reader.load_symbols(tm.symbols)
+        for tick, command in reader:
+            tm.time = tick
+            if echo:
+                tm.events.emit("command", "> {command}", command=format_command(command, tm.symbols))
+            tm.execute(command)
+    tm.flush_commits()
+    tm.events.flush()
+    return tm
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Converts scripts to binary traces and replays them")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    convert_parser = subparsers.add_parser("convert", help="compile .txt scripts to .trace files")
+    convert_parser.add_argument("inputs", nargs="+", help="scripts or folders of .txt scripts")
+    convert_parser.add_argument("--output", default=None, help="folder of the traces, next to each script by default")
+    replay_parser = subparsers.add_parser("replay", help="run .trace files")
+    replay_parser.add_argument("traces", nargs="+")
+    replay_parser.add_argument("--echo", action="store_true", help="print each command before running it")
+    args = parser.parse_args()
+
+    if args.action == "convert":
+        scripts = []
+        for path in args.inputs:
+            if os.path.isdir(path):
+                scripts.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.txt'))
+            else:
+                scripts.append(path)
+        for script in scripts:
+            folder = args.output if args.output is not None else os.path.dirname(script)
+            output = os.path.join(folder, os.path.splitext(os.path.basename(script))[0] + ".trace")
+            count = convert(script, output)
+            print(f"{script} -> {output} ({count} records)")
+        return
+
+    for path in args.traces:
+        print(f"Processing {path}")
+        replay(path, echo=args.echo)
+        print("--------------------------------------------------------------------------------------")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+import argparse
+import random
+import sys
+
+from events import EventSink, NullSink
+from serialization_graph import RW, SerializationGraph
+from transaction_manager import TransactionManager
+from validation import ValidationScheduler
+
+# The concurrency controls, SSI modes, group commit and parallel validation are only reachable through
+# TransactionManager arguments, so the scripts in ./inputs (run with the defaults) never exercise them.
+# This driver runs hand-written scripts with known outcomes and random workloads under each of them.
+
+# (name, TransactionManager arguments, script, transactions expected to commit)
+SCRIPTS = [
+    ("si allows write skew", {"concurrency": "si"},
+     ["begin(T1)", "begin(T2)", "R(T1,x2)", "R(T2,x4)", "W(T1,x4,1)", "W(T2,x2,2)", "end(T1)", "end(T2)"],
+     {"T1", "T2"}),
+    ("si first committer wins", {"concurrency": "si"},
+     ["begin(T1)", "begin(T2)", "W(T1,x2,1)", "W(T2,x2,2)", "end(T1)", "end(T2)"],
+     {"T1"}),
+    ("ssi aborts write skew", {"concurrency": "ssi"},
+     ["begin(T1)", "begin(T2)", "R(T1,x2)", "R(T2,x4)", "W(T1,x4,1)", "W(T2,x2,2)", "end(T1)", "end(T2)"],
+     {"T1"}),
+    ("ssi flags aborts write skew", {"concurrency": "ssi", "ssi_mode": "flags"},
+     ["begin(T1)", "begin(T2)", "R(T1,x2)", "R(T2,x4)", "W(T1,x4,1)", "W(T2,x2,2)", "end(T1)", "end(T2)"],
+     {"T1"}),
+    # A commit flushed at the tick of the next begin() is in that transaction's snapshot, so it is not a conflict
+    ("ssi flags reader of a group commit at its start time", {"concurrency": "ssi", "ssi_mode": "flags", "group_commit": 5},
+     ["begin(T0)", "begin(T1)", "begin(T3)", "W(T3,x4,1)", "end(T3)", "R(T1,x4)", "W(T1,x2,5)", "end(T1)",
+      "begin(T2)", "R(T2,x2)", "end(T2)"],
+     {"T1", "T2", "T3"}),
+    ("2pl aborts the requester of a held lock", {"concurrency": "2pl"},
+     ["begin(T1)", "begin(T2)", "R(T1,x2)", "W(T2,x2,2)", "end(T1)", "end(T2)"],
+     {"T1"}),
+    ("2pl reads the latest committed version", {"concurrency": "2pl"},
+     ["begin(T1)", "begin(T2)", "W(T1,x2,1)", "end(T1)", "R(T2,x2)", "W(T2,x4,2)", "end(T2)"],
+     {"T1", "T2"}),
+    ("occ aborts a stale reader", {"concurrency": "occ"},
+     ["begin(T1)", "begin(T2)", "R(T2,x2)", "W(T1,x2,1)", "end(T1)", "W(T2,x4,2)", "end(T2)"],
+     {"T1"}),
+    ("occ lets blind writers commit", {"concurrency": "occ"},
+     ["begin(T1)", "begin(T2)", "W(T1,x2,1)", "W(T2,x2,2)", "end(T1)", "end(T2)"],
+     {"T1", "T2"}),
+    ("early write conflicts abort the second writer", {"concurrency": "si", "write_conflicts": "abort"},
+     ["begin(T1)", "begin(T2)", "W(T1,x2,1)", "end(T1)", "W(T2,x2,2)", "end(T2)"],
+     {"T1"}),
+]
+
+# Options every random workload is run under. Graph mode SSI is left out of the serializability check:
+# its serialization graph has no edge from a reader to a writer that committed while the reader ran.
+SERIALIZABLE = [
+    {"concurrency": "2pl"},
+    {"concurrency": "occ"},
+    {"concurrency": "ssi", "ssi_mode": "flags"},
+    {"concurrency": "2pl", "group_commit": 3},
+    {"concurrency": "occ", "group_commit": 3},
+    {"concurrency": "ssi", "ssi_mode": "flags", "group_commit": 3},
+]
+SNAPSHOT_ISOLATED = [
+    {"concurrency": "si"},
+    {"concurrency": "si", "write_conflicts": "abort"},
+    {"concurrency": "si", "write_conflicts": "flag"},
+    {"concurrency": "ssi"},
+    {"concurrency": "ssi", "ssi_mode": "flags"},
+    {"concurrency": "ssi", "group_commit": 3},
+]
+
+
+class RecordingSink(EventSink):
+    # Keeps every event as (manager time, event, fields, text line) for the checks below
+    name = "recording"
+
+    def __init__(self):
+        self.manager = None
+        self.records = []
+
+    def attach(self, manager):
+        self.manager = manager
+
+    def emit(self, event, template, **fields):
+        self.records.append((self.manager.time, event, fields, template.format(**fields)))
+
+
+def random_script(seed, commands=40, transactions=6, variables=20, failures=False):
+    # Command lines of a random workload of at most `transactions` concurrent transactions
+    r = random.Random(seed)
+    lines, active, down = [], [], set()
+    started = 0
+    for _ in range(commands):
+        choice = r.random()
+        if choice < 0.12 or not active:
+            if len(active) >= transactions:
+                lines.append(f"end({active.pop(0)})")
+                continue
+            started += 1
+            active.append(f"T{started}")
+            lines.append(f"begin(T{started})")
+        elif choice < 0.45:
+            lines.append(f"R({r.choice(active)},x{r.randint(1, variables)})")
+        elif choice < 0.75:
+            lines.append(f"W({r.choice(active)},x{r.randint(1, variables)},{r.randint(1, 999)})")
+        elif choice < 0.9:
+            transaction = r.choice(active)
+            active.remove(transaction)
+            lines.append(f"end({transaction})")
+        elif failures and choice < 0.95:
+            site = r.randint(1, 10)
+            if site in down:
+                down.discard(site)
+                lines.append(f"recover({site})")
+            else:
+                down.add(site)
+                lines.append(f"fail({site})")
+        else:
+            lines.append("dump()")
+    lines.extend(f"end({transaction})" for transaction in active)
+    return lines
+
+
+def run(lines, **options):
+    # Runs lines on a new manager and returns it with the events it reported
+    sink = RecordingSink()
+    tm = TransactionManager(events=sink, **options)
+    for line in lines:
+        tm.process_command(line)
+    tm.flush_commits()
+    return tm, sink.records
+
+
+def database(tm):
+    # Variable name to value, from the first site holding each variable
+    state = {}
+    for site in tm.sites.values():
+        for variable, value in zip(site.variable_ids, site.values):
+            state.setdefault(tm.symbols.variable_name(variable), value)
+    return state
+
+
+def committed(records):
+    return {fields["transaction"] for _, event, fields, _ in records if event == "commit"}
+
+
+def is_serializable(tm, records):
+    """
+    Searches for a serial order of the committed transactions that gives every read the value it saw
+    and leaves the database in its final state. Only meant for histories without site failures.
+    """
+    operations = {}
+    for _, event, fields, _ in records:
+        if event in ("read", "write"):
+            operations.setdefault(fields["transaction"], []).append((event, fields["variable"], fields["value"]))
+    final = database(tm)
+
+    def search(state, remaining):
+        if not remaining:
+            return state == final
+        for transaction in remaining:
+            local = dict(state)
+            for event, variable, value in operations.get(transaction, []):
+                if event == "write":
+                    local[variable] = value
+                elif local[variable] != value:
+                    break
+            else:
+                if search(local, remaining - {transaction}):
+                    return True
+        return False
+
+    return search(database(TransactionManager(events=RecordingSink())), frozenset(committed(records)))
+
+
+def first_committer_wins(records):
+    # True if no two committed transactions that ran concurrently wrote a common variable
+    started, commit_times, written = {}, {}, {}
+    for time, event, fields, _ in records:
+        if event == "begin":
+            started[fields["transaction"]] = time
+        elif event == "commit":
+            commit_times[fields["transaction"]] = time
+        elif event == "write":
+            written.setdefault(fields["transaction"], set()).add(fields["variable"])
+    transactions = sorted(commit_times)
+    for i, first in enumerate(transactions):
+        for second in transactions[i + 1:]:
+            concurrent = commit_times[first] > started[second] and commit_times[second] > started[first]
+            if concurrent and written.get(first, set()) & written.get(second, set()):
+                return False
+    return True
+
+
+def closes_dangerous_cycle(graph, src, dst):
+    # Brute force over the simple paths dst ~> src: True if one closes, with src -> dst, a cycle with two
+    # consecutive RW edges, wrap-around included
+    closing = graph.edge_mask(src, dst)
+
+    def search(txn, visited, masks):
+        if txn == src:
+            masks = masks + [closing]
+            return any(mask & RW and masks[(i + 1) % len(masks)] & RW for i, mask in enumerate(masks))
+        return any(search(neighbor, visited | {neighbor}, masks + [mask])
+                   for neighbor, mask in graph.edges.get(txn, {}).items() if neighbor not in visited)
+
+    return search(dst, {dst}, [])
+
+
+def check_serialization_graph(seeds):
+    # detect_cycle and detect_batch_cycle may not miss a dangerous cycle through the new edges, whichever path
+    # they happen to find first
+    failures = []
+    graph = SerializationGraph(events=NullSink())
+    for src, dst, edge_type in [("A", "S", "WW"), ("B", "S", "RW"), ("D", "A", "WW"), ("D", "B", "RW"), ("S", "D", "RW")]:
+        graph.add_edge(src, dst, edge_type)
+        found = graph.detect_cycle(src, dst, edge_type)
+    if not found:
+        failures.append("S -> D closing S -> D -> B -> S with RW edges only was not detected")
+
+    for seed in range(seeds):
+        r = random.Random(seed)
+        graph = SerializationGraph(events=NullSink())
+        transactions = r.randint(4, 7)
+        for step in range(30):
+            if r.random() < 0.5:
+                src, dst = r.sample(range(transactions), 2)
+                edge_type = r.choice(["WW", "RW", "WR"])
+                if not graph.add_edge(src, dst, edge_type):
+                    continue
+                expected = closes_dangerous_cycle(graph, src, dst)
+                if graph.detect_cycle(src, dst, edge_type):
+                    graph.remove(dst)
+                elif expected:
+                    failures.append(f"seed {seed} step {step}: detect_cycle missed a dangerous cycle through {src} -> {dst}")
+            else:
+                dst = r.randrange(transactions)
+                new_edges = []
+                for src in r.sample([txn for txn in range(transactions) if txn != dst], r.randint(1, 3)):
+                    if graph.add_edge(src, dst, r.choice(["WW", "RW", "WR"])):
+                        new_edges.append((src, dst))
+                expected = any(closes_dangerous_cycle(graph, src, dst) for src, dst in new_edges)
+                edge = graph.detect_batch_cycle(new_edges)
+                if edge is not None:
+                    graph.remove(edge[1])
+                elif expected:
+                    failures.append(f"seed {seed} step {step}: detect_batch_cycle missed a dangerous cycle through {new_edges}")
+    return failures
+
+
+def check_scripts():
+    failures = []
+    for name, options, lines, expected in SCRIPTS:
+        _, records = run(lines, **options)
+        if committed(records) != expected:
+            failures.append(f"{name}: {sorted(committed(records))} committed, expected {sorted(expected)}")
+    return failures
+
+
+def check_serializable(seeds):
+    failures = []
+    for options in SERIALIZABLE:
+        for seed in range(seeds):
+            tm, records = run(random_script(seed), **options)
+            if not is_serializable(tm, records):
+                failures.append(f"{options} seed {seed}: committed history is not serializable")
+    return failures
+
+
+def check_snapshot_isolation(seeds):
+    failures = []
+    for options in SNAPSHOT_ISOLATED:
+        for seed in range(seeds):
+            _, records = run(random_script(seed, failures=seed % 2 == 0), **options)
+            if not first_committer_wins(records):
+                failures.append(f"{options} seed {seed}: concurrent transactions committed writes to the same variable")
+    return failures
+
+
+def check_group_commit(seeds):
+    # Group commit must leave no transaction behind and keep the graph order consistent, and parallel
+    # validation must not change the output at all
+    failures = []
+    validators = [ValidationScheduler(3, "thread"), ValidationScheduler(2, "process")]
+    try:
+        for ssi_mode in TransactionManager.SSI_MODES:
+            for seed in range(seeds):
+                lines = random_script(seed, commands=80, transactions=8, failures=seed % 2 == 0)
+                outputs = []
+                for validator in [None] + validators:
+                    tm, records = run(lines, ssi_mode=ssi_mode, group_commit=6, validator=validator)
+                    outputs.append([line for _, _, _, line in records])
+                    if tm.transactions or tm.commit_batch:
+                        failures.append(f"{ssi_mode} seed {seed}: transactions left after the last flush")
+                    graph = tm.serialization_graph
+                    for source, targets in graph.edges.items():
+                        for target in targets:
+                            if (source, target) not in graph.back_edges and graph.position[source] >= graph.position[target]:
+                                failures.append(f"{ssi_mode} seed {seed}: edge {source} -> {target} out of graph order")
+                if any(output != outputs[0] for output in outputs[1:]):
+                    failures.append(f"{ssi_mode} seed {seed}: parallel validation changed the output")
+    finally:
+        for validator in validators:
+            validator.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the concurrency controls, group commit and parallel validation")
+    parser.add_argument("--seeds", type=int, default=200, help="random workloads per configuration")
+    args = parser.parse_args()
+
+    checks = [
+        ("scripts", check_scripts),
+        ("serialization graph", lambda: check_serialization_graph(args.seeds)),
+        ("serializable", lambda: check_serializable(args.seeds)),
+        ("snapshot isolation", lambda: check_snapshot_isolation(args.seeds)),
+        ("group commit", lambda: check_group_commit(args.seeds)),
+    ]
+    failed = False
+    for name, check in checks:
+        failures = check()
+        print(f"{name}: {'ok' if not failures else f'{len(failures)} failures'}")
+        for failure in failures[:10]:
+            print(f"  {failure}")
+        failed = failed or bool(failures)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
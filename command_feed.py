@@ -0,0 +1,52 @@
+import queue
+import threading
+
+
+class CommandFeed:
+    """
+    Bounded hand-off of command lines from a producer thread to main.process_stream.
+
+    put() blocks while `maxsize` lines are waiting, so a producer that generates a workload faster
+    than the manager runs it is held back instead of piling the script up in memory.
+
+    Args:
+        maxsize (int): Lines that can wait in the feed before put() blocks.
+    """
+    END = object() # marks the end of the feed in the queue
+
+    def __init__(self, maxsize=1024):
+        self.queue = queue.Queue(maxsize)
+        self.error = None # exception raised by the producer of from_iterable, re-raised to the consumer
+
+    def put(self, line):
+        self.queue.put(line)
+
+    def close(self):
+        self.queue.put(self.END)
+
+    def __iter__(self):
+        while True:
+            line = self.queue.get()
+            if line is self.END:
+                break
+            yield line
+        if self.error is not None:
+            raise self.error
+
+    @classmethod
+    def from_iterable(cls, lines, maxsize=1024):
+        # Feed filled by a daemon thread pulling from lines (e.g. a workload generator), so producing
+        # the next lines overlaps with running the current ones
+        feed = cls(maxsize)
+
+        def produce():
+            try:
+                for line in lines:
+                    feed.put(line)
+            except BaseException as error:
+                feed.error = error
+            finally:
+                feed.close()
+
+        threading.Thread(target=produce, daemon=True).start()
+        return feed
@@ -0,0 +1,132 @@
+from sites import VALUE_MIN, VALUE_MAX
+
+# Opcodes of compiled commands. TransactionManager.dispatch maps each one to the method that runs it.
+BEGIN = 0 # args: (transaction,) or (transaction, read_only, deferrable)
+READ = 1 # args: (transaction, variable)
+WRITE = 2 # args: (transaction, variable, value)
+END = 3 # args: (transaction,)
+DUMP = 4 # args: ()
+FAIL = 5 # args: (site id,)
+RECOVER = 6 # args: (site id,)
+ERROR = 7 # args: (message,), printed as is
+OPCODE_NAMES = ("BEGIN", "READ", "WRITE", "END", "DUMP", "FAIL", "RECOVER", "ERROR")
+
+
+class Command:
+    # A command line compiled to an opcode and its arguments, with names already interned to ints
+    __slots__ = ("opcode", "args")
+
+    def __init__(self, opcode, args=()):
+        self.opcode = opcode
+        self.args = args
+
+    def __eq__(self, other):
+        return isinstance(other, Command) and (self.opcode, self.args) == (other.opcode, other.args)
+
+    def __repr__(self):
+        return f"Command({OPCODE_NAMES[self.opcode]}, {self.args})"
+
+
+class CommandParser:
+    """
+    Compiles command lines such as "W(T1, x2, 100)" into Command objects.
+
+    The keyword before the first "(" selects the parse function from a dispatch table, and the
+    transaction and variable names are interned through the SymbolTable once per distinct line.
+    Compiled forms are cached by the raw line, so a line repeated in a script is parsed only once.
+
+    Args:
+        symbols (SymbolTable): Table the names are interned in.
+        cache_size (int): Distinct lines kept in the cache before it is cleared, 0 to disable it.
+    """
+    def __init__(self, symbols, cache_size=65536):
+        self.symbols = symbols
+        self.cache_size = cache_size
+        self.cache = {} # Dict of raw line to its Command, None for blank and comment-only lines
+        self.hits = 0
+        self.misses = 0
+        self.keywords = {
+            'begin': self.parse_begin,
+            'beginRO': self.parse_begin_read_only,
+            'R': self.parse_read,
+            'W': self.parse_write,
+            'end': self.parse_end,
+            'dump': self.parse_dump,
+            'fail': self.parse_fail,
+            'recover': self.parse_recover,
+        }
+
+    def parse(self, line):
+        # Command for line, None if it is blank once comments are removed
+        command = self.cache.get(line, self)
+        if command is not self:
+            self.hits += 1
+            return command
+        self.misses += 1
+        command = self.compile(line)
+        if self.cache_size:
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[line] = command
+        return command
+
+    def compile(self, line):
+        command = line.split('//', 1)[0].strip() if '//' in line else line
+        if not command:
+            return None
+        command = command.strip() # a line of only spaces still counts as an (unknown) command
+        keyword, paren, inside = command.partition('(')
+        parse = self.keywords.get(keyword) if paren and command.endswith(')') else None
+        if parse is None:
+            return Command(ERROR, (f"Unknown command: {command}",))
+        return parse(command, inside[:-1])
+
+    def parse_begin(self, command, inside):
+        return Command(BEGIN, (self.symbols.transaction(inside),))
+
+    def parse_begin_read_only(self, command, inside):
+        parts = [part.strip() for part in inside.split(',')]
+        if len(parts) == 1 or (len(parts) == 2 and parts[1] == 'deferrable'):
+            return Command(BEGIN, (self.symbols.transaction(parts[0]), True, len(parts) == 2))
+        return Command(ERROR, (f"Invalid read-only begin command: {command}",))
+
+    def parse_read(self, command, inside):
+        parts = [part.strip() for part in inside.split(',')]
+        if len(parts) != 2:
+            return Command(ERROR, (f"Invalid read command: {command}",))
+        transaction_name, variable_name = parts
+        return Command(READ, (self.symbols.transaction(transaction_name), self.symbols.variable(variable_name)))
+
+    def parse_write(self, command, inside):
+        parts = [part.strip() for part in inside.split(',')]
+        if len(parts) != 3:
+            return Command(ERROR, (f"Invalid write command: {command}",))
+        transaction_name, variable_name, value = parts
+        try:
+            number = int(value)
+        except ValueError:
+            return Command(ERROR, (f"Invalid write value: {value}",))
+        if not VALUE_MIN <= number <= VALUE_MAX:
+            return Command(ERROR, (f"Invalid write value: {value}",))
+        value = number
+        return Command(WRITE, (self.symbols.transaction(transaction_name), self.symbols.variable(variable_name), value))
+
+    def parse_end(self, command, inside):
+        return Command(END, (self.symbols.transaction(inside),))
+
+    def parse_dump(self, command, inside):
+        if inside:
+            return Command(ERROR, (f"Unknown command: {command}",))
+        return Command(DUMP)
+
+    def parse_fail(self, command, inside):
+        return self.parse_site(FAIL, inside)
+
+    def parse_recover(self, command, inside):
+        return self.parse_site(RECOVER, inside)
+
+    def parse_site(self, opcode, inside):
+        try:
+            return Command(opcode, (int(inside),))
+        except ValueError:
+            return Command(ERROR, (f"Invalid site id: {inside}",))
@@ -0,0 +1,155 @@
+class ConcurrencyControl:
+    """
+    Base concurrency control strategy of a TransactionManager.
+
+    The manager calls the hooks below from read, write, commit and finish_transaction, so the same
+    sites, transactions and command language run under any strategy.
+    """
+    name = None
+    batches_graph = False # group commits can add the serialization graph edges of a whole batch at once
+    first_committer_wins = False # writes to a variable committed after the snapshot abort, so write_conflicts applies
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def read_timestamp(self, transaction):
+        # Versions committed at or before this time are visible to the read
+        return transaction.start_time
+
+    def on_read(self, transaction, variable):
+        # Called before transaction reads variable; returns False if the transaction was aborted instead
+        return True
+
+    def on_write(self, transaction, variable):
+        # Called before transaction writes variable; returns False if the transaction was aborted instead
+        return True
+
+    def validate(self, transaction, batch_writes=()):
+        # Commit-time check, batch_writes holds the variables written by earlier members of a group commit.
+        # Returns False after aborting the transaction.
+        return True
+
+    def on_finish(self, transaction):
+        # Called once transaction committed or aborted
+        pass
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class SnapshotIsolation(ConcurrencyControl):
+    # Reads from the start_time snapshot and first-committer-wins on writes, with no check for write skew
+    name = "si"
+    first_committer_wins = True
+
+    def on_write(self, transaction, variable):
+        # With write_conflicts other than "commit", the first-committer-wins check also runs at the write
+        if self.manager.write_conflicts != "commit":
+            return self.manager.check_write_conflict(transaction, variable)
+        return True
+
+    def validate(self, transaction, batch_writes=()):
+        return transaction.check_first_committer(batch_writes)
+
+
+class SerializableSnapshotIsolation(SnapshotIsolation):
+    # Snapshot isolation plus a check for dangerous structures, in the manager's ssi_mode
+    name = "ssi"
+
+    @property
+    def batches_graph(self):
+        return self.manager.ssi_mode == "graph"
+
+    def on_read(self, transaction, variable):
+        if self.manager.ssi_mode == "flags":
+            transaction.mark_read_conflicts(variable)
+            return transaction.transaction_id in self.manager.transactions
+        return True
+
+    def validate(self, transaction, batch_writes=()):
+        if not transaction.check_first_committer(batch_writes):
+            return False
+        if self.manager.ssi_mode == "flags":
+            return transaction.check_conflict_flags()
+        return transaction.add_graph_edges()
+
+
+class TwoPhaseLocking(ConcurrencyControl):
+    """
+    Strict two-phase locking with a no-wait policy.
+
+    Reads take shared locks and writes exclusive ones, all held until the transaction ends. Commands
+    arrive one at a time and cannot block, so a request that conflicts with a lock held by another
+    transaction aborts the requester. Reads see the latest committed version instead of a snapshot.
+    """
+    name = "2pl"
+
+    def __init__(self, manager):
+        super().__init__(manager)
+        self.shared = {} # Dict of variable to the set of transactions holding a shared lock on it
+        self.exclusive = {} # Dict of variable to the transaction holding an exclusive lock on it
+        self.held = {} # Dict of transaction to the set of variables it locked
+
+    def read_timestamp(self, transaction):
+        return transaction.start_time if transaction.read_only else self.manager.time
+
+    def on_read(self, transaction, variable):
+        txn = transaction.transaction_id
+        holder = self.exclusive.get(variable, txn)
+        if holder != txn:
+            return self.conflict(transaction, variable, holder)
+        self.shared.setdefault(variable, set()).add(txn)
+        self.held.setdefault(txn, set()).add(variable)
+        return True
+
+    def on_write(self, transaction, variable):
+        txn = transaction.transaction_id
+        holder = self.exclusive.get(variable, txn)
+        if holder == txn:
+            holder = next((other for other in self.shared.get(variable, ()) if other != txn), txn)
+        if holder != txn:
+            return self.conflict(transaction, variable, holder)
+        self.exclusive[variable] = txn
+        self.held.setdefault(txn, set()).add(variable)
+        return True
+
+    def conflict(self, transaction, variable, holder):
+        symbols = self.manager.symbols
+        self.manager.events.emit("abort_cause", "{transaction} aborts because {variable} is locked by {holder}", transaction=transaction.name,
+                                 variable=symbols.variable_name(variable), holder=symbols.transaction_name(holder), cause="lock_conflict")
+        self.manager.abort_transaction(transaction.transaction_id)
+        return False
+
+    def on_finish(self, transaction):
+        txn = transaction.transaction_id
+        for variable in self.held.pop(txn, ()):
+            readers = self.shared.get(variable)
+            if readers is not None:
+                readers.discard(txn)
+                if not readers:
+                    del self.shared[variable]
+            if self.exclusive.get(variable) == txn:
+                del self.exclusive[variable]
+
+
+class OptimisticConcurrencyControl(ConcurrencyControl):
+    """
+    Backward-validation OCC (Kung and Robinson).
+
+    Reads come from the start_time snapshot and writes are buffered. At commit, the transaction aborts
+    if a transaction that committed after it started wrote a variable it read.
+    """
+    name = "occ"
+
+    def validate(self, transaction, batch_writes=()):
+        for variable in transaction.variables_read:
+            if self.manager.last_commits.get(variable, -1) > transaction.start_time or variable in batch_writes:
+                self.manager.events.emit("abort_cause", "{transaction} aborts because {variable} was committed by another transaction after we started",
+                                         transaction=transaction.name, variable=self.manager.symbols.variable_name(variable), cause="validation")
+                transaction.abort()
+                return False
+        return True
+
+
+CONCURRENCY_CONTROLS = {strategy.name: strategy for strategy in
+                        (SnapshotIsolation, SerializableSnapshotIsolation, TwoPhaseLocking, OptimisticConcurrencyControl)}
@@ -0,0 +1,130 @@
+import json
+import sys
+from abc import ABC, abstractmethod
+
+
+class EventSink(ABC):
+    """
+    Destination of the events a TransactionManager reports: begins, reads, writes, commits, aborts,
+    site failures and so on.
+
+    Every event has a name, a str.format template giving its human-readable line and the fields the
+    template refers to, e.g. emit("read", "{transaction} reads {variable} = {value} at site {site}", ...).
+    Fields the template does not use are still part of the event. A sink only formats what it outputs,
+    so a NullSink skips the string formatting entirely.
+    """
+    name = None
+    enabled = True # False if events are dropped, so callers can skip building costly fields
+
+    def attach(self, manager):
+        # Called by the TransactionManager the sink reports for
+        pass
+
+    @abstractmethod
+    def emit(self, event, template, **fields):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class TextSink(EventSink):
+    # One print() per event in the original human-readable format, to sys.stdout by default.
+    # Output appears as soon as it is emitted, so it suits interactive use and streamed input.
+    name = "text"
+
+    def __init__(self, file=None):
+        self.file = file # None looks up sys.stdout on every event, so redirect_stdout still captures it
+
+    def emit(self, event, template, **fields):
+        print(template.format(**fields), file=self.file)
+
+    def flush(self):
+        (self.file if self.file is not None else sys.stdout).flush()
+
+
+class BufferedFileSink(EventSink):
+    """
+    Human-readable lines like TextSink, written to a file buffer_lines events at a time.
+
+    Args:
+        file (str or file): Path of the file to write, a file object, or None for sys.stdout.
+        buffer_lines (int): Events held in memory before they are written.
+    """
+    name = "file"
+
+    def __init__(self, file=None, buffer_lines=4096):
+        self.owned = isinstance(file, str)
+        self.file = open(file, 'w') if self.owned else file
+        self.buffer_lines = buffer_lines
+        self.lines = []
+
+    def render(self, event, template, fields):
+        return template.format(**fields)
+
+    def emit(self, event, template, **fields):
+        self.lines.append(self.render(event, template, fields))
+        if len(self.lines) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self):
+        file = self.file if self.file is not None else sys.stdout
+        if self.lines:
+            self.lines.append("")
+            file.write("\n".join(self.lines))
+            self.lines = []
+        file.flush()
+
+    def close(self):
+        self.flush()
+        if self.owned:
+            self.file.close()
+
+
+class JsonLinesSink(BufferedFileSink):
+    # One JSON object per line with the event name, the manager's time and the fields, buffered like
+    # BufferedFileSink. Values JSON has no type for, such as sets and sites, are written as their str().
+    name = "jsonl"
+
+    def __init__(self, file=None, buffer_lines=4096):
+        super().__init__(file, buffer_lines)
+        self.manager = None
+
+    def attach(self, manager):
+        self.manager = manager
+
+    def render(self, event, template, fields):
+        record = {"event": event}
+        if self.manager is not None:
+            record["time"] = self.manager.time
+        record.update(fields)
+        return json.dumps(record, default=str)
+
+
+class NullSink(EventSink):
+    # Drops every event, for benchmarks that measure the manager without any output
+    name = "null"
+    enabled = False
+
+    def emit(self, event, template, **fields):
+        pass
+
+
+SINKS = {sink.name: sink for sink in (TextSink, BufferedFileSink, JsonLinesSink, NullSink)}
+
+
+def make_sink(name, file=None):
+    # Sink for a command line choice: "text" is buffered to file when one is given
+    if name not in SINKS:
+        raise ValueError(f"Unknown event sink: {name}")
+    if name == "text" and file is not None:
+        return BufferedFileSink(file)
+    if name == "null":
+        return NullSink()
+    return SINKS[name](file)
@@ -1,26 +1,121 @@
 from transaction_manager import TransactionManager
+from events import SINKS, make_sink
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import contextlib
+import io
 import os
+import sys
 
-def process_input(input_file, input_folder):
-    tm = TransactionManager()
+SEPARATOR = "--------------------------------------------------------------------------------------"
+
+def process_stream(lines, tm=None):
+    # Runs the commands of any iterable of lines: a file, sys.stdin, a named pipe, a generator or a
+    # CommandFeed. Lines are pulled one at a time, so the script is never held in memory and a slow
+    # manager holds back the producer.
+    if tm is None:
+        tm = TransactionManager()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('//'):
+            tm.time += 1
+            continue
+        tm.events.emit("command", "> {command}", command=line)
+        tm.process_command(line)
+    # Commits still pending in a group commit batch at the end of the input
+    tm.flush_commits()
+    tm.events.flush()
+    return tm
+
+def process_input(input_file, input_folder, events=None):
     input_file = os.path.join(input_folder, input_file)
 
     with open(input_file, 'r') as file:
-        for line in file:
-            line = line.strip()
-            if not line or line.startswith('//'):
-                tm.time += 1
-                continue
-            print(f"> {line}")
-            tm.process_command(line)
+        process_stream(file, TransactionManager(events=events))
+
+def run_script(label, lines, events):
+    # Runs one script in a fresh TransactionManager, between its "Processing" line and the separator
+    tm = TransactionManager(events=events)
+    events.emit("script", "Processing {script}", script=label)
+    process_stream(lines, tm)
+    events.emit("script_end", SEPARATOR, script=label)
+
+def capture_script(label, path, sink_name):
+    # Runs one script with a new sink of sink_name and returns everything it wrote to stdout.
+    # Worker function of --jobs: scripts share no state, so each one can run in its own process.
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), open(path, 'r') as file:
+        events = make_sink(sink_name)
+        run_script(label, file, events)
+        events.flush()
+    return output.getvalue()
+
+def run_parallel(scripts, jobs, sink_name="text", out=None):
+    """
+    Runs scripts in a pool of processes and writes each one's output as a contiguous block.
+
+    Blocks are written in the order of scripts as soon as every earlier script has finished,
+    so the output does not depend on which worker finishes first.
+
+    Args:
+        scripts (list): (label, path) pairs; the label is printed in the "Processing" line.
+        jobs (int): Number of worker processes.
+        sink_name (str): Event sink of the workers, a key of events.SINKS.
+        out (file): Where the blocks are written, sys.stdout by default.
+    """
+    out = out if out is not None else sys.stdout
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        outputs = pool.map(capture_script, [label for label, _ in scripts], [path for _, path in scripts],
+                           [sink_name] * len(scripts))
+        for output in outputs:
+            out.write(output)
+    out.flush()
 
 def main():
-    input_folder = './inputs'
-    #iterate through all the input files in the input folder and call process input on the files
-    for file in os.listdir(input_folder):
-        print(f"Processing {file}")
-        process_input(file, input_folder)
-        print("--------------------------------------------------------------------------------------")
+    parser = argparse.ArgumentParser(description="Runs transaction scripts, by default every file in ./inputs")
+    parser.add_argument("sources", nargs="*", help="script files or named pipes to run in order, - for stdin")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="run the scripts in N worker processes, printed in sorted order")
+    parser.add_argument("--events", choices=[name for name in SINKS if name != "file"], default="text",
+                        help="output format: text as before, JSON lines, or null for no output at all")
+    parser.add_argument("--events-file", default=None, help="write the output, buffered, to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.jobs is not None:
+        if args.jobs < 1:
+            parser.error(f"--jobs must be positive: {args.jobs}")
+        if '-' in args.sources:
+            parser.error("stdin cannot be read with --jobs")
+        if args.sources:
+            scripts = [(source, source) for source in sorted(args.sources)]
+        else:
+            scripts = [(file, os.path.join('./inputs', file)) for file in sorted(os.listdir('./inputs'))]
+        if args.events_file is None:
+            run_parallel(scripts, args.jobs, args.events)
+        else:
+            with open(args.events_file, 'w') as out:
+                run_parallel(scripts, args.jobs, args.events, out)
+        return
+
+    events = make_sink(args.events, args.events_file)
+    try:
+        if args.sources:
+            for source in args.sources:
+                if source == '-':
+                    run_script(source, sys.stdin, events)
+                else:
+                    # open() blocks on a named pipe until a writer connects, then reads it as it is written
+                    with open(source, 'r') as file:
+                        run_script(source, file, events)
+            return
+
+        input_folder = './inputs'
+        #iterate through all the input files in the input folder and run each one
+        for file in os.listdir(input_folder):
+            with open(os.path.join(input_folder, file), 'r') as lines:
+                run_script(file, lines, events)
+    finally:
+        events.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,165 @@
+import random
+import threading
+import time
+from collections import Counter
+
+
+class TransactionAborted(Exception):
+    # Raised inside a transaction body once the manager aborted the transaction
+    def __init__(self, name):
+        super().__init__(f"{name} aborted")
+        self.name = name
+
+
+class RetriesExhausted(TransactionAborted):
+    # Raised by RetryEngine.run when the last allowed attempt aborted too
+    def __init__(self, name, attempts):
+        Exception.__init__(self, f"{name} aborted {attempts} times, giving up")
+        self.name = name
+        self.attempts = attempts
+
+
+class RetryPolicy:
+    """
+    How often and how long to wait before re-running an aborted transaction.
+
+    The n-th retry waits base_delay * multiplier ** (n - 1) seconds, capped at max_delay, minus a
+    random share of up to `jitter` of it so that transactions aborted together do not retry together.
+
+    Args:
+        max_attempts (int): Attempts before giving up, the first one included.
+        base_delay (float): Delay in seconds before the first retry.
+        max_delay (float): Upper bound of the delay in seconds.
+        multiplier (float): Growth of the delay per retry.
+        jitter (float): Share of the delay, from 0 to 1, that is randomized away.
+    """
+    def __init__(self, max_attempts=5, base_delay=0.001, max_delay=0.1, multiplier=2.0, jitter=0.5):
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts must be positive: {max_attempts}")
+        if not 0 <= jitter <= 1:
+            raise ValueError(f"jitter must be between 0 and 1: {jitter}")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def backoff(self, retry, rng=random):
+        # Seconds to wait before the retry-th retry (1 for the first one)
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (retry - 1))
+        return delay * (1 - self.jitter * rng.random())
+
+    def __repr__(self):
+        return (f"RetryPolicy(max_attempts={self.max_attempts}, base_delay={self.base_delay}, "
+                f"max_delay={self.max_delay}, multiplier={self.multiplier}, jitter={self.jitter})")
+
+
+class TransactionContext:
+    # Handle passed to a transaction body. Every operation is one time tick, as with process_command,
+    # runs under the engine's lock and raises TransactionAborted once the manager has aborted the transaction.
+    def __init__(self, engine, transaction_id):
+        self.manager = engine.manager
+        self.lock = engine.lock
+        self.transaction_id = transaction_id
+        self.transaction = self.manager.transactions[transaction_id]
+        self.name = self.transaction.name
+
+    def read(self, variable_name):
+        # Value of variable_name (e.g. "x2"), None if the read waits for a site to recover
+        with self.lock:
+            self.manager.time += 1
+            value = self.manager.read(self.transaction_id, self.manager.symbols.variable(variable_name))
+            self.check()
+        return value
+
+    def write(self, variable_name, value):
+        with self.lock:
+            self.manager.time += 1
+            self.manager.write(self.transaction_id, self.manager.symbols.variable(variable_name), value)
+            self.check()
+
+    def check(self):
+        if self.manager.transactions.get(self.transaction_id) is not self.transaction:
+            raise TransactionAborted(self.name)
+
+
+class RetryEngine:
+    """
+    Runs transaction bodies against a TransactionManager and re-runs them when they abort.
+
+    A body is a function of a TransactionContext. It runs between begin and end of a fresh transaction
+    with the given name. When the transaction aborts during the body or at commit, the engine waits
+    as the policy says and runs the body again on a new snapshot.
+
+    Several client threads can call run() on the same engine: each manager operation takes the
+    engine's lock, so bodies interleave one operation at a time, like the commands of a script.
+
+    Args:
+        manager (TransactionManager): The manager to run transactions on.
+        policy (RetryPolicy): Backoff and attempt limit, RetryPolicy() by default.
+        sleep (callable): Called with the backoff delay in seconds, time.sleep by default.
+        rng (random.Random): Source of the jitter.
+    """
+    def __init__(self, manager, policy=None, sleep=time.sleep, rng=None):
+        self.manager = manager
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.sleep = sleep
+        self.rng = rng if rng is not None else random.Random()
+        self.runs = 0 # bodies that committed
+        self.retries = 0 # re-runs after an abort
+        self.exhausted = 0 # bodies given up after max_attempts
+        self.attempts = Counter() # attempts needed -> number of committed bodies
+        self.lock = threading.Lock() # serializes manager operations across client threads
+
+    def run(self, name, body, read_only=False):
+        """
+        Args:
+            name (str): Transaction name, e.g. "T1"; every attempt reuses it.
+            body (callable): Function of a TransactionContext; its result is returned once the transaction commits.
+            read_only (bool): Begin the transaction read-only.
+
+        Returns:
+            The body's result from the attempt that committed.
+
+        Raises:
+            RetriesExhausted: If all policy.max_attempts attempts aborted.
+        """
+        manager = self.manager
+        with self.lock:
+            transaction_id = manager.symbols.transaction(name)
+        for attempt in range(1, self.policy.max_attempts + 1):
+            if attempt > 1:
+                with self.lock:
+                    self.retries += 1
+                    manager.stats.retries += 1
+                    delay = self.policy.backoff(attempt - 1, self.rng)
+                self.sleep(delay)
+            with self.lock:
+                manager.time += 1
+                manager.begin_transaction(transaction_id, read_only=read_only)
+                context = TransactionContext(self, transaction_id)
+            try:
+                result = body(context)
+            except TransactionAborted:
+                continue
+            except BaseException:
+                with self.lock:
+                    if manager.transactions.get(transaction_id) is context.transaction:
+                        manager.abort_transaction(transaction_id)
+                raise
+            with self.lock:
+                if manager.transactions.get(transaction_id) is context.transaction:
+                    manager.time += 1
+                    manager.end_transaction(transaction_id, manager.sites)
+                    if context.transaction in manager.commit_batch:
+                        manager.flush_commits()
+                if context.transaction.commit_time is not None:
+                    self.runs += 1
+                    self.attempts[attempt] += 1
+                    return result
+        with self.lock:
+            self.exhausted += 1
+        raise RetriesExhausted(name, self.policy.max_attempts)
+
+    def __repr__(self):
+        return f"RetryEngine(runs={self.runs}, retries={self.retries}, exhausted={self.exhausted})"
@@ -0,0 +1,334 @@
+import heapq
+
+from events import TextSink
+
+# Edge types are stored as bits so one entry per (src, dst) pair holds all of them
+WW = 1
+RW = 2
+WR = 4
+EDGE_TYPES = {"WW": WW, "RW": RW, "WR": WR}
+
+
+def edge_type_names(mask):
+    return '|'.join(name for name, bit in EDGE_TYPES.items() if mask & bit)
+
+
+class SerializationGraph:
+    def __init__(self, name_of=str, events=None):
+        self.name_of = name_of # turns a transaction id back into its name for output
+        self.events = events if events is not None else TextSink() # reports the cycles found
+        self.edges = {} # Dict of src transaction to dict of dst transaction to edge type bitmask
+        self.incoming = {} # Dict of dst transaction to the set of src transactions with an edge into it
+        self.order = [] # transactions in topological order, None marks a removed slot
+        self.position = {} # Dict of transaction to its index in order
+        self.back_edges = set() # (src, dst) edges that closed an allowed cycle, exempt from the order
+
+    def add_edge(self, src, dst, edge_type):
+        # Returns False if src -> dst already had this edge type
+        bit = EDGE_TYPES[edge_type]
+        targets = self.edges.setdefault(src, {})
+        mask = targets.get(dst, 0)
+        if mask & bit:
+            return False
+        targets[dst] = mask | bit
+        self.incoming.setdefault(dst, set()).add(src)
+        return True
+
+    def edge_mask(self, src, dst):
+        return self.edges.get(src, {}).get(dst, 0)
+
+    def predecessors(self, txn):
+        # Transactions with an edge into txn
+        return self.incoming.get(txn, ())
+
+    def detect_cycle(self, src, dst, edge_type):
+        """
+        Checks whether the edge src -> dst, just added to the graph, closes a cycle with two
+        consecutive RW edges.
+
+        A topological order of the graph is maintained online, so only the region of the order
+        between dst and src has to be searched. Cycles without consecutive RW edges are allowed to
+        stay; their closing edges are kept in back_edges and exempted from the order.
+
+        Args:
+            src (int): The transaction the new edge starts from.
+            dst (int): The transaction the new edge points to.
+            edge_type (str): The type of the new edge ("WW", "RW" or "WR").
+
+        Returns:
+            bool: True if a problematic cycle was created.
+        """
+        src_position = self.position_of(src)
+        dst_position = self.position_of(dst)
+
+        # Order-respecting edges only move forward, so a path dst ~> src can only climb above src
+        # to reach the source of a back edge; it never visits anything above the highest of those.
+        upper = max([src_position] + [self.position[a] for a, _ in self.back_edges])
+        if dst_position > upper:
+            return False
+
+        cycle = self.find_cycle(src, dst, upper)
+        if cycle is None:
+            if src_position > dst_position:
+                self.reorder(src, dst)
+            return False
+
+        if self.is_dangerous(src, dst, cycle):
+            return True  # Problematic cycle detected
+
+        self.back_edges.add((src, dst))
+        return False
+
+    def is_dangerous(self, src, dst, cycle):
+        # Prints the cycle closed by src -> dst and whether it has two consecutive RW edges, including wrap-around
+        cycle_path, cycle_masks = cycle
+        cycle_path.append(dst)
+        cycle_masks.append(self.edge_mask(src, dst))  # Include the closing edge
+        cycle_edge_types = [edge_type_names(mask) for mask in cycle_masks]
+        self.events.emit("cycle", "Cycle detected: {path} with edge types {edge_types}",
+                         path=' -> '.join(self.name_of(txn) for txn in cycle_path), edge_types=cycle_edge_types)
+
+        for i in range(len(cycle_masks)):
+            current_edge = cycle_masks[i]
+            next_edge = cycle_masks[(i + 1) % len(cycle_masks)]
+            if current_edge & RW and next_edge & RW:
+                self.events.emit("consecutive_rw", "Consecutive 'RW' edges found: {first} -> {second}",
+                                 first=cycle_edge_types[i], second=cycle_edge_types[(i + 1) % len(cycle_masks)])
+                return True
+        return False
+
+    def detect_batch_cycle(self, new_edges):
+        """
+        Checks a batch of (src, dst) edges, all already added to the graph, with one cycle analysis.
+
+        Instead of searching once per edge, the strongly connected components of the region of the
+        order that the batch can close cycles in are computed in a single pass. Only edges inside a
+        component close a cycle, and only those are searched for a path. If none of the cycles has two
+        consecutive RW edges, the closing edges become back edges and the region is reordered once.
+
+        Args:
+            new_edges (list): (src, dst) edges added by the batch, in the order they were added.
+
+        Returns:
+            tuple: The last (src, dst) edge of the batch that closes a cycle with two consecutive RW edges, or None.
+        """
+        new_edges = [(src, dst) for src, dst in new_edges if self.edge_mask(src, dst)]
+        for src, dst in new_edges:
+            self.position_of(src)
+            self.position_of(dst)
+        # Same bound as detect_cycle, taken once for the whole batch
+        upper = max([self.position[src] for src, _ in new_edges] + [self.position[a] for a, _ in self.back_edges], default=-1)
+        candidates = [(src, dst) for src, dst in new_edges if self.position[dst] <= upper]
+        if not candidates:
+            return None
+        lower = min([self.position[dst] for _, dst in candidates] + [self.position[b] for _, b in self.back_edges])
+
+        component = self.components(lower, upper)
+        # Latest edges first, so the transaction reported is the one that committed last in the batch
+        for src, dst in reversed(candidates):
+            # Nothing in the region has a path down to a src below it, so that edge closes no cycle. A back edge
+            # is searched again, the batch may have given it an RW type
+            if src not in component or component[src] != component[dst]:
+                continue
+            cycle = self.find_cycle(src, dst, upper)
+            if self.is_dangerous(src, dst, cycle):
+                return src, dst
+            self.back_edges.add((src, dst))
+
+        self.reorder_region(lower, upper)
+        return None
+
+    def components(self, lower, upper):
+        # Iterative Tarjan: strongly connected component index of every transaction in order[lower..upper],
+        # following only edges that stay inside that region
+        index = {}
+        low = {}
+        component = {}
+        stack = []
+        on_stack = set()
+        for root in self.order[lower:upper + 1]:
+            if root is None or root in index:
+                continue
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.edges.get(root, {})))]
+            while work:
+                txn, neighbors = work[-1]
+                for neighbor in neighbors:
+                    if not lower <= self.position[neighbor] <= upper:
+                        continue
+                    if neighbor not in index:
+                        index[neighbor] = low[neighbor] = len(index)
+                        stack.append(neighbor)
+                        on_stack.add(neighbor)
+                        work.append((neighbor, iter(self.edges.get(neighbor, {}))))
+                        break
+                    if neighbor in on_stack:
+                        low[txn] = min(low[txn], index[neighbor])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[txn])
+                    if low[txn] == index[txn]:
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component[member] = txn
+                            if member == txn:
+                                break
+        return component
+
+    def reorder_region(self, lower, upper):
+        # Topologically sorts order[lower..upper] by the edges that are not back edges, keeping the
+        # current relative order where the edges allow it, and puts the result back in the same slots
+        slots = [i for i in range(lower, upper + 1) if self.order[i] is not None]
+        region = {self.order[i] for i in slots}
+        indegree = {txn: 0 for txn in region}
+        for txn in region:
+            for neighbor in self.edges.get(txn, {}):
+                if neighbor in region and (txn, neighbor) not in self.back_edges:
+                    indegree[neighbor] += 1
+        ready = [(self.position[txn], txn) for txn in region if not indegree[txn]]
+        heapq.heapify(ready)
+        moved = []
+        while ready:
+            _, txn = heapq.heappop(ready)
+            moved.append(txn)
+            for neighbor in self.edges.get(txn, {}):
+                if neighbor in region and (txn, neighbor) not in self.back_edges:
+                    indegree[neighbor] -= 1
+                    if not indegree[neighbor]:
+                        heapq.heappush(ready, (self.position[neighbor], neighbor))
+        for i, txn in zip(slots, moved):
+            self.order[i] = txn
+            self.position[txn] = i
+
+    def position_of(self, txn):
+        # New transactions go at the end of the topological order
+        if txn not in self.position:
+            self.position[txn] = len(self.order)
+            self.order.append(txn)
+        return self.position[txn]
+
+    def find_path(self, start, target, upper):
+        # Iterative DFS for a path start ~> target through transactions at or below upper in the order.
+        # Returns the transactions on the path and the edge type masks along it, or None.
+        visited = {start}
+        path = [start]
+        masks = []
+        stack = [iter(self.edges.get(start, {}).items())]
+        while stack:
+            for neighbor, mask in stack[-1]:
+                if neighbor == target:
+                    return path + [target], masks + [mask]
+                if neighbor not in visited and self.position[neighbor] <= upper:
+                    visited.add(neighbor)
+                    path.append(neighbor)
+                    masks.append(mask)
+                    stack.append(iter(self.edges.get(neighbor, {}).items()))
+                    break
+            else:
+                stack.pop()
+                path.pop()
+                if masks:
+                    masks.pop()
+        return None
+
+    def find_cycle(self, src, dst, upper):
+        # A path dst ~> src for the cycle closed by src -> dst, or None. The first path found is kept unless it
+        # is harmless and another one gives the cycle two consecutive RW edges.
+        cycle = self.find_path(dst, src, upper)
+        if cycle is None:
+            return None
+        closing = self.edge_mask(src, dst)
+        masks = cycle[1] + [closing]
+        if any(mask & RW and masks[(i + 1) % len(masks)] & RW for i, mask in enumerate(masks)):
+            return cycle
+        return self.find_dangerous_path(dst, src, upper, closing & RW) or cycle
+
+    def find_dangerous_path(self, start, target, upper, closing_rw):
+        # Iterative DFS for a path start ~> target that has two consecutive RW edges, counting the wrap-around
+        # through a closing edge target -> start with RW bit closing_rw. Unlike find_path it visits
+        # (transaction, last edge had RW, consecutive RW edges seen) states, so it does not stop at the first
+        # path to each transaction. Returns the transactions on the path and its edge type masks, or None.
+        first = (start, bool(closing_rw), False)
+        visited = {first}
+        path = [start]
+        masks = []
+        stack = [(first, iter(self.edges.get(start, {}).items()))]
+        while stack:
+            (txn, last_rw, seen), neighbors = stack[-1]
+            for neighbor, mask in neighbors:
+                rw = bool(mask & RW)
+                found = seen or (last_rw and rw)
+                if neighbor == target:
+                    if found or (rw and closing_rw):
+                        return path + [target], masks + [mask]
+                    continue
+                state = (neighbor, rw, found)
+                if state not in visited and self.position[neighbor] <= upper:
+                    visited.add(state)
+                    path.append(neighbor)
+                    masks.append(mask)
+                    stack.append((state, iter(self.edges.get(neighbor, {}).items())))
+                    break
+            else:
+                stack.pop()
+                path.pop()
+                if masks:
+                    masks.pop()
+        return None
+
+    def reorder(self, src, dst):
+        # src -> dst points backwards in the order: move everything dst reaches within
+        # [dst, src] to just after src, keeping relative order on both sides of the split.
+        lower = self.position[dst]
+        upper = self.position[src]
+        reached = {dst}
+        stack = [dst]
+        while stack:
+            txn = stack.pop()
+            for neighbor in self.edges.get(txn, {}):
+                if neighbor not in reached and (txn, neighbor) not in self.back_edges and self.position[neighbor] <= upper:
+                    reached.add(neighbor)
+                    stack.append(neighbor)
+
+        slots = [i for i in range(lower, upper + 1) if self.order[i] is not None]
+        region = [self.order[i] for i in slots]
+        moved = [txn for txn in region if txn not in reached] + [txn for txn in region if txn in reached]
+        for i, txn in zip(slots, moved):
+            self.order[i] = txn
+            self.position[txn] = i
+
+    def remove(self, txn):
+        # Drops txn with all its edges, touching only its neighbors.
+        # Returns whether it had outgoing edges and the transactions that had edges into it.
+        had_outgoing = txn in self.edges
+        if had_outgoing:
+            for neighbor in self.edges.pop(txn):
+                if neighbor in self.incoming:
+                    self.incoming[neighbor].discard(txn)
+
+        predecessors = []
+        for predecessor in self.incoming.pop(txn, ()):
+            if predecessor in self.edges:
+                self.edges[predecessor].pop(txn, None)
+                predecessors.append(predecessor)
+
+        # Free its slot in the topological order and drop any back edges it took part in
+        if txn in self.position:
+            self.order[self.position.pop(txn)] = None
+            self.back_edges = {edge for edge in self.back_edges if txn not in edge}
+            if len(self.position) * 2 < len(self.order):
+                self.order = [t for t in self.order if t is not None]
+                self.position = {t: i for i, t in enumerate(self.order)}
+
+        return had_outgoing, predecessors
+
+    def __contains__(self, txn):
+        return txn in self.edges or txn in self.incoming
+
+    def __repr__(self):
+        return repr({self.name_of(src): {self.name_of(dst): edge_type_names(mask) for dst, mask in targets.items()} for src, targets in self.edges.items()})
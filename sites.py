@@ -1,19 +1,54 @@
-from variable import Variable
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Values are stored in 64-bit integer columns
+VALUE_MIN = -2 ** 63
+VALUE_MAX = 2 ** 63 - 1
 
 class Site:
-    def __init__(self, site_id):
-        self.site_id = site_id # from 1 to 10
-        self.variables = {}  # Key: variable name, Value: num
+    def __init__(self, site_id, topology):
+        self.site_id = site_id # from 1 to topology.num_sites
+        self.topology = topology
         self.is_up = True 
-        self.commitTime = {}# Dictionary of the variable, commit time
         self.initialize_variables()
         self.failTime = []
     def initialize_variables(self):
-         for i in range(1, 21):
-            if i % 2 == 0 or (1 + (i % 10)) == self.site_id:
-                var_name = f"x{i}"
-                self.commitTime[var_name]=0
-                self.variables[var_name] = Variable(var_name, 10 * i)
+        # Column layout: slot k holds the k-th smallest variable index stored at this site.
+        # values and commit_times hold the latest committed version, as 64-bit integers.
+        self.variable_ids = array('q', self.topology.variables_at[self.site_id])
+        self.values = array('q', (10 * i for i in self.variable_ids))
+        self.commit_times = array('q', bytes(8 * len(self.variable_ids)))
+        self.history = {} # Dict of slot to its superseded (commit time, value) versions, oldest first
+
+    def slot_of(self, variable):
+        # Column index of variable (the index N of xN) at this site, None if the site does not hold it
+        slot = bisect_left(self.variable_ids, variable)
+        if slot < len(self.variable_ids) and self.variable_ids[slot] == variable:
+            return slot
+        return None
+
+    def read_version(self, variable, timestamp):
+        # (commit time, value) of the version visible to a snapshot taken at timestamp
+        slot = self.slot_of(variable)
+        if self.commit_times[slot] <= timestamp:
+            return self.commit_times[slot], self.values[slot]
+        # The history is sorted by commit time, oldest first
+        older = self.history[slot]
+        index = bisect_right(older, (timestamp, float('inf'))) - 1
+        return older[max(index, 0)]
+
+    def commit(self, variable, value, commit_time):
+        # The current version moves to the history and the new one takes its place in the columns
+        # The columns are updated first, so a value they reject leaves the site unchanged
+        slot = self.slot_of(variable)
+        previous = (self.commit_times[slot], self.values[slot])
+        self.values[slot] = value
+        self.commit_times[slot] = commit_time
+        self.history.setdefault(slot, []).append(previous)
+
+    def failed_between(self, start, end):
+        # True if the site failed strictly between start and end
+        return any(start < failTime < end for failTime in self.failTime)
 
     def fail(self):
         self.is_up = False
@@ -21,9 +56,11 @@ class Site:
     def recover(self):
         self.is_up = True
 
+    def __contains__(self, variable):
+        return self.slot_of(variable) is not None
+
     def __repr__(self):
-        vars_list = sorted(self.variables.values(), key=lambda v: int(v.name[1:]))
-        vars_str = ', '.join(str(var) for var in vars_list)
+        vars_str = ', '.join(f"x{index}: {value}" for index, value in zip(self.variable_ids, self.values))
         if not self.is_up:
             return f"Site {self.site_id} -- DOWN -- {vars_str}"
         return f"Site {self.site_id} -- {vars_str}"
@@ -0,0 +1,69 @@
+import time
+
+class TransactionStats:
+    # Throughput, latency and abort rate of the transactions run by a TransactionManager.
+    # Latency is kept both in manager time ticks (commands) and in wall-clock seconds.
+    def __init__(self):
+        self.started = {} # Dict of active transaction id to its (begin tick, begin wall-clock time)
+        self.commits = 0
+        self.aborts = 0
+        self.retries = 0 # re-runs of aborted transactions, counted by RetryEngine
+        self.latency_ticks = 0 # summed over committed transactions
+        self.latency_seconds = 0.0 # summed over committed transactions
+        self.first_begin = None # wall-clock time of the first begin
+        self.last_finish = None # wall-clock time of the last commit or abort
+
+    def begin(self, transaction_id, tick):
+        now = time.perf_counter()
+        if self.first_begin is None:
+            self.first_begin = now
+        self.started[transaction_id] = (tick, now)
+
+    def finish(self, transaction_id, tick, committed):
+        begin = self.started.pop(transaction_id, None)
+        if begin is None:
+            return
+        self.last_finish = time.perf_counter()
+        if committed:
+            self.commits += 1
+            self.latency_ticks += tick - begin[0]
+            self.latency_seconds += self.last_finish - begin[1]
+        else:
+            self.aborts += 1
+
+    def elapsed(self):
+        if self.first_begin is None or self.last_finish is None:
+            return 0.0
+        return self.last_finish - self.first_begin
+
+    def throughput(self):
+        # Commits per wall-clock second
+        elapsed = self.elapsed()
+        return self.commits / elapsed if elapsed else 0.0
+
+    def abort_rate(self):
+        finished = self.commits + self.aborts
+        return self.aborts / finished if finished else 0.0
+
+    def mean_latency(self):
+        # (ticks, seconds) from begin to commit, averaged over committed transactions
+        if not self.commits:
+            return 0.0, 0.0
+        return self.latency_ticks / self.commits, self.latency_seconds / self.commits
+
+    def summary(self):
+        latency_ticks, latency_seconds = self.mean_latency()
+        return {
+            "commits": self.commits,
+            "aborts": self.aborts,
+            "retries": self.retries,
+            "abort_rate": self.abort_rate(),
+            "throughput": self.throughput(),
+            "latency_ticks": latency_ticks,
+            "latency_seconds": latency_seconds,
+        }
+
+    def __repr__(self):
+        latency_ticks, latency_seconds = self.mean_latency()
+        return (f"{self.commits} commits, {self.aborts} aborts ({self.abort_rate():.1%}), {self.retries} retries, "
+                f"{self.throughput():.0f} commits/s, mean latency {latency_ticks:.1f} ticks / {latency_seconds * 1e6:.0f} us")
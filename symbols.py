@@ -0,0 +1,36 @@
+class SymbolTable:
+    # Interns transaction ids ("T1") and variable names ("x8") to integers when commands are parsed.
+    # Transactions get dense ids 0, 1, 2, ... in order of first appearance. A variable xN becomes N;
+    # any other variable name gets a negative id, which no site holds.
+    def __init__(self):
+        self.transaction_ids = {} # Dict of transaction name to its id
+        self.transaction_names = [] # transaction names indexed by id
+        self.unknown_variable_ids = {} # Dict of malformed variable name to its negative id
+        self.unknown_variable_names = [] # malformed variable names indexed by -id - 1
+
+    def transaction(self, name):
+        transaction_id = self.transaction_ids.get(name)
+        if transaction_id is None:
+            transaction_id = len(self.transaction_names)
+            self.transaction_ids[name] = transaction_id
+            self.transaction_names.append(name)
+        return transaction_id
+
+    def transaction_name(self, transaction_id):
+        return self.transaction_names[transaction_id]
+
+    def variable(self, name):
+        digits = name[1:]
+        if name[:1] == 'x' and digits.isascii() and digits.isdigit() and str(int(digits)) == digits:
+            return int(digits)
+        variable = self.unknown_variable_ids.get(name)
+        if variable is None:
+            variable = -len(self.unknown_variable_names) - 1
+            self.unknown_variable_ids[name] = variable
+            self.unknown_variable_names.append(name)
+        return variable
+
+    def variable_name(self, variable):
+        if variable >= 0:
+            return f"x{variable}"
+        return self.unknown_variable_names[-variable - 1]
@@ -0,0 +1,45 @@
+from array import array
+
+class Topology:
+    # Number of sites and variables and where each variable is replicated.
+    # replication is "even" (even-indexed variables at every site, odd ones at site 1 + index mod num_sites),
+    # "full" (every variable at every site), "single" (every variable at site 1 + index mod num_sites),
+    # or a function of (variable index, num_sites) returning the site ids that hold the variable.
+    REPLICATION_RULES = ("even", "full", "single")
+
+    def __init__(self, num_sites=10, num_variables=20, replication="even"):
+        if not callable(replication) and replication not in self.REPLICATION_RULES:
+            raise ValueError(f"Unknown replication rule: {replication}")
+        self.num_sites = num_sites
+        self.num_variables = num_variables
+        self.replication = replication
+        self.build_placement()
+
+    def build_placement(self):
+        # Placement index: replicas[i] is the sorted tuple of site ids holding x{i}, shared between variables
+        # with the same placement so it stays small for millions of variables
+        all_sites = tuple(range(1, self.num_sites + 1))
+        single_site = [None] + [(site_id,) for site_id in all_sites]
+        shared = {}
+        self.replicas = [()]
+        self.variables_at = {site_id: array('q') for site_id in all_sites} # site id -> sorted indexes of the variables it holds
+        for i in range(1, self.num_variables + 1):
+            if self.replication == "full" or (self.replication == "even" and i % 2 == 0):
+                sites = all_sites
+            elif self.replication in ("even", "single"):
+                sites = single_site[1 + (i % self.num_sites)]
+            else:
+                sites = tuple(sorted(self.replication(i, self.num_sites)))
+                sites = shared.setdefault(sites, sites)
+            self.replicas.append(sites)
+            for site_id in sites:
+                self.variables_at[site_id].append(i)
+
+    def replicas_of(self, variable):
+        # Site ids holding variable (the index N of xN) in ascending order, empty if there is no such variable
+        if not 1 <= variable <= self.num_variables:
+            return ()
+        return self.replicas[variable]
+
+    def __repr__(self):
+        return f"Topology(num_sites={self.num_sites}, num_variables={self.num_variables}, replication={self.replication!r})"
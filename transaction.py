@@ -1,202 +1,219 @@
-import copy
+from validation import commit_edges
+
 class Transaction:
-    def __init__(self, transaction_id, start_time, sites, manager):
-        self.transaction_id = transaction_id
-        self.start_time = start_time
-        self.initial_sites = copy.deepcopy(sites)
-        self.variables_write = set()  # set of variables written by this transaction
+    def __init__(self, transaction_id, start_time, sites, manager, read_only=False):
+        self.transaction_id = transaction_id # interned id, see SymbolTable
+        self.name = manager.symbols.transaction_name(transaction_id)
+        self.start_time = start_time # the snapshot is every version committed at or before start_time
+        self.write_buffer = {}  # variable -> pending value, applied to the sites only at commit
+        self.write_sites = {}  # variable -> set of site ids that were up to take the write
         self.variables_read = set()  # set of variables read by this transaction
-        self.sites_snapshot = copy.deepcopy(sites) # snapshot of the sites at the start of the transaction
         self.is_active = True
         self.manager = manager
-
-
-    def read(self, variable_name):
-        self.variables_read.add(variable_name)
+        self.commit_time = None # set once the transaction commits
+        self.in_conflict = False # a concurrent transaction has an rw-antidependency to us (flags SSI mode)
+        self.out_conflict = False # we have an rw-antidependency to a concurrent transaction (flags SSI mode)
+        self.read_only = read_only # reads a safe snapshot and never takes part in SSI validation
+        self.safe_snapshot_wait = None # deferrable read-only: id -> read-write transaction it waits for, None once safe
+        self.write_conflict = None # first variable written after a concurrent commit of it, with write_conflicts="flag"
+        self.deferred_operations = [] # ("R", variable) and ("end", None) operations held until the snapshot is safe
+
+
+    # Returns the value read, None if the read waits for a site to recover or the transaction aborts
+    def read(self, variable):
+        variable_name = self.manager.symbols.variable_name(variable)
+        events = self.manager.events
+        self.variables_read.add(variable)
         found = False
-        for i in range(1, 11):
-            site = self.sites_snapshot[i]
-            if site.is_up and variable_name in site.variables:
-                try:
-                    if len(site.failTime) == 0:
-                        print(f"{self.transaction_id} reads {variable_name} = {site.variables[variable_name].value} at site {site.site_id}")
-                        found = True
-                        return
-                    else:
-                        for failTime in site.failTime:
-                            if self.manager.verbose:
-                                print(f"failtime: {failTime}")
-                                # print all the values that we are checking below in if
-                                print(f"site.commitTime[variable_name]: {site.commitTime[variable_name]} < failTime: {failTime} < self.start_time: {self.start_time}")
-                            if site.commitTime[variable_name] < failTime < self.start_time:
-                                if self.manager.verbose:
-                                    print({self.manager.last_commits.get(variable_name, 0)} and {failTime} and {self.start_time})
-                                raise Exception(f"Site {site.site_id} failed at {failTime}")
-
-                            print(f"{self.transaction_id} reads {variable_name} = {site.variables[variable_name].value} at site {site.site_id}")
-                            found = True
-                            return
-                except Exception as e:
-                    pass
-            # else:
-            #     # else site is down , we check the same as above and instead of reading it at that time we put it in a wait queue.
-            #     try:
-            #         #last commit time<site failure time<transaction start time
-            #         if len(site.failTime) == 0:
-            #             print(f"site.commitTime[variable_name]: {site.commitTime[variable_name]} < failTime: {failTime} < self.start_time: {self.start_time}")
-            #             print(f"{self.transaction_id} reads {variable_name} = {site.variables[variable_name].value} at site {site.site_id}")
-            #             self.manager.waiting_transactions[site.site_id].append((self.transaction_id, variable_name))
-            #             found = True
-            #             break
-            #             return
-            #         else:
-            #             for failTime in site.failTime:
-            #                 if site.commitTime[variable_name] < failTime < self.start_time:
-            #                     raise Exception(f"Site {site.site_id} failed at {failTime}")
-
-            #                 # print(f"{self.transaction_id} reads {variable_name} = {site.variables[variable_name].value} at site {site.site_id}")
-            #             self.manager.waiting_transactions[site.site_id].append((self.transaction_id, variable_name))
-            #             found = True
-            #             break
-            #             return
-        for i in range(1, 11):
+        timestamp = self.manager.concurrency.read_timestamp(self) # start_time, except under locking
+        replicas = self.manager.topology.replicas_of(variable)
+        for i in replicas:
+            site = self.manager.sites[i]
+            if site.is_up:
+                commit_time, value = site.read_version(variable, timestamp)
+                if self.manager.verbose:
+                    events.emit("debug", "failtime: {fail_time}", fail_time=site.failTime)
+                    events.emit("debug", "commitTime: {commit_time} < failTime < self.start_time: {start_time}",
+                                commit_time=commit_time, start_time=self.start_time)
+                #last commit time<site failure time<transaction start time
+                if site.failed_between(commit_time, timestamp):
+                    continue
+                # Read-your-own-writes: a pending write overlays the committed version
+                value = self.write_buffer.get(variable, value)
+                events.emit("read", "{transaction} reads {variable} = {value} at site {site}",
+                            transaction=self.name, variable=variable_name, value=value, site=site.site_id)
+                found = True
+                return value
+
+        for i in replicas:
             site = self.manager.sites[i]
-            if site.is_up==False and variable_name in site.variables:
-                try:
-                    #last commit time<site failure time<transaction start time
-                    if self.manager.verbose:
-                        print(f"failtime: {site.failTime} and {site.site_id}")
-                        print(f"len(failTime): {len(site.failTime)}")
-                    if len(site.failTime) == 0:
-                        if self.manager.verbose:
-                            print(f"site.commitTime[variable_name]: {site.commitTime[variable_name]} < failTime: {site.failTime} < self.start_time: {self.start_time}XYZ")
-                        print(f"{self.transaction_id} reads {variable_name} = {site.variables[variable_name].value} at site {site.site_id}")
-                        self.manager.waiting_transactions[site.site_id].append((self.transaction_id, variable_name))
-                        found = True
-                        return
-                    else:
-                        for failTime in site.failTime:
-                            if self.manager.verbose:
-                                print(f"commitTime: {site.commitTime[variable_name]} < failTime: {failTime} < self.start_time: {self.start_time}")
-                            if site.commitTime[variable_name] < failTime < self.start_time:
-                                raise Exception(f"Site {site.site_id} failed at {failTime}")
-                            else:
-                                if self.manager.verbose:
-                                    print("Adding to waiting transactions")
-                                print(f"{self.transaction_id} will read {variable_name} at site {site.site_id} after site recovers")
-                                # self.manager.waiting_transactions[site.site_id].append((self.transaction_id, variable_name,i))#saves transaction id, variable name and site id
-                                if site.site_id not in self.manager.waiting_transactions:
-                                    self.manager.waiting_transactions[site.site_id] = []  # Initialize with an empty list
-                                self.manager.waiting_transactions[site.site_id].append((self.transaction_id, variable_name, i))
-                                if self.manager.verbose:
-                                    print(f"waiting_transactions: {self.manager.waiting_transactions}")
-                                found = True
-                                return
-                            # print(f"{self.transaction_id} reads {variable_name} = {site.variables[variable_name].value} at site {site.site_id}")
-                        
-
-                except Exception as e:
-                    
-                    pass
+            if site.is_up==False:
+                commit_time, _ = site.read_version(variable, timestamp)
+                if self.manager.verbose:
+                    events.emit("debug", "failtime: {fail_time} and {site}", fail_time=site.failTime, site=site.site_id)
+                    events.emit("debug", "commitTime: {commit_time} < failTime < self.start_time: {start_time}",
+                                commit_time=commit_time, start_time=self.start_time)
+                #last commit time<site failure time<transaction start time
+                if site.failed_between(commit_time, timestamp):
+                    continue
+                if self.manager.verbose:
+                    events.emit("debug", "Adding to waiting transactions")
+                events.emit("read_wait", "{transaction} will read {variable} at site {site} after site recovers",
+                            transaction=self.name, variable=variable_name, site=site.site_id)
+                if site.site_id not in self.manager.waiting_transactions:
+                    self.manager.waiting_transactions[site.site_id] = []  # Initialize with an empty list
+                self.manager.waiting_transactions[site.site_id].append((self.transaction_id, variable, i))#saves transaction id, variable name and site id
+                if self.manager.verbose:
+                    events.emit("debug", "waiting_transactions: {waiting}", waiting=self.manager.waiting_transactions)
+                found = True
+                return
 
         #Abort this transaction if the variable is not available in any of the sites
-        print(found)
+        events.emit("read_found", "{found}", found=found)
         if found == False:
-            print(f"{self.transaction_id} aborts because {variable_name} is not available in any of the sites")
+            events.emit("abort_cause", "{transaction} aborts because {variable} is not available in any of the sites",
+                        transaction=self.name, variable=variable_name, cause="unavailable")
             self.manager.abort_transaction(self.transaction_id)
 
-    def write(self, variable_name, value):
-        for i in range(1, 11):
-            site = self.sites_snapshot[i]
-            #if the site is up and the variable is present in the site then change the value of it
-            if site.is_up and variable_name in site.variables:
-                site.variables[variable_name].value = value
-                self.variables_write.add(variable_name)
-                print(f"{self.transaction_id} writes in local snapshot the {variable_name} = {value} at site {site.site_id}")
-
-        #print the state of the sites after writing
+    def write(self, variable, value):
+        variable_name = self.manager.symbols.variable_name(variable)
+        events = self.manager.events
+        if self.read_only:
+            events.emit("write_rejected", "{transaction} is read-only and cannot write {variable}",
+                        transaction=self.name, variable=variable_name)
+            return
+        for i in self.manager.topology.replicas_of(variable):
+            site = self.manager.sites[i]
+            #if the site is up then buffer the write for that site
+            if site.is_up:
+                self.write_buffer[variable] = value
+                self.write_sites.setdefault(variable, set()).add(site.site_id)
+                events.emit("write", "{transaction} writes in local snapshot the {variable} = {value} at site {site}",
+                            transaction=self.name, variable=variable_name, value=value, site=site.site_id)
+
+        #print the write buffer after writing
         if self.manager.verbose:
-            print("After writing:")
-            for site in self.sites_snapshot.values():
-                print(site)
+            events.emit("debug", "After writing:")
+            events.emit("debug", "write buffer: {write_buffer}, write sites: {write_sites}",
+                        write_buffer=self.write_buffer, write_sites=self.write_sites)
 
-    # returns the new value of the sites if the transaction is not aborted. Or else it sends the abort signal and returns null
+    # returns the write buffer if the transaction is not aborted. Or else it sends the abort signal and returns null
     def commit(self, current_sites):
-        for variable_name in self.variables_write:
-            last_commit_time = self.manager.last_commits.get(variable_name, -1)
+        # A read-only transaction read a safe snapshot, so it has nothing to validate
+        if self.read_only:
+            self.manager.events.emit("commit", "{transaction} commits", transaction=self.name)
+            self.commit_time = self.manager.time
+            return self.write_buffer
+
+        # First-committer-wins and the SSI checks, or whatever the manager's concurrency control validates
+        if not self.manager.concurrency.validate(self):
+            return None
+
+        # If we reach here, we can commit
+        self.mark_committed()
+        return self.write_buffer
+
+    # First-committer-wins: returns False, after aborting, if a variable we wrote was committed by another
+    # transaction after we started, or is in batch_writes (written by an earlier member of a group commit)
+    def check_first_committer(self, batch_writes=()):
+        for variable in self.write_buffer:
+            last_commit_time = self.manager.last_commits.get(variable, -1)
             
             # If some other transaction committed this variable after we started, abort.
-            if last_commit_time > self.start_time:
-                print(f"{self.transaction_id} aborts because {variable_name} was already committed by another transaction after we started")
-                self.abort()
-                return None
-            
-        # Add edges to the serialization graph for this transaction
-        for var in self.variables_write:
-            # Check if this var exisits in self.manager.overall_writes and add edges to the serialization graph of the transactions
-            if var in self.manager.overall_writes:
-                for txn, timestamp in self.manager.overall_writes[var]:
-                    if txn != self.transaction_id and timestamp < self.manager.time:
-                        if txn not in self.manager.serialization_graph:
-                            self.manager.serialization_graph[txn] = []
-                        if self.transaction_id not in self.manager.serialization_graph[txn]:
-                            self.manager.serialization_graph[txn].append([self.transaction_id, "WW"])
-                            print(f"Added WW edge from {txn} to {self.transaction_id}")
-
-                            # Check if adding this Edge creates a cycle in the graph
-                            if self.manager.detect_cycle():
-                                print(f"{self.transaction_id} aborts due to cycle in serialization graph")
-                                self.manager.remove_transaction(self.transaction_id)
-                                self.abort()
-                                return None
-
-            #Do the same for overall reads
-            if var in self.manager.overall_reads:
-                for txn, timestamp in self.manager.overall_reads[var]:
-                    if txn != self.transaction_id and timestamp < self.manager.time:
-                        if txn not in self.manager.serialization_graph:
-                            self.manager.serialization_graph[txn] = []
-                        if self.transaction_id not in self.manager.serialization_graph[txn]:
-                            self.manager.serialization_graph[txn].append([self.transaction_id, "RW"])
-                            print(f"Added RW edge from {txn} to {self.transaction_id}")
-
-                            # Check if adding this Edge creates a cycle in the graph
-                            if self.manager.detect_cycle():
-                                print(f"{self.transaction_id} aborts due to cycle in serialization graph")
-                                self.manager.remove_transaction(self.transaction_id)
-                                self.abort()
-                                return None
-
-
-        for var in self.variables_read:
-            if var in self.manager.overall_writes:
-                for txn, timestamp in self.manager.overall_writes[var]:
-                    if txn != self.transaction_id and timestamp > self.manager.time:
-                        if txn not in self.manager.serialization_graph:
-                            self.manager.serialization_graph[txn] = []
-                        if self.transaction_id not in self.manager.serialization_graph[txn]:
-                            self.manager.serialization_graph[txn].append([self.transaction_id, "WR"])
-                            print(f"Added WR edge from {txn} to {self.transaction_id}")
-                           
-                            # Check if adding this Edge creates a cycle in the graph
-                            if self.manager.detect_cycle():
-                                print(f"{self.transaction_id} aborts due to cycle in serialization graph")
-                                self.manager.remove_transaction(self.transaction_id)
-                                self.abort()
-                                return None
+            if last_commit_time > self.start_time or variable in batch_writes:
+                self.abort_write_conflict(variable)
+                return False
+        return True
 
-        # If we reach here, we can commit
-        print(f"{self.transaction_id} commits")
+    def abort_write_conflict(self, variable):
+        variable_name = self.manager.symbols.variable_name(variable)
+        self.manager.events.emit("abort_cause", "{transaction} aborts because {variable} was already committed by another transaction after we started",
+                                 transaction=self.name, variable=variable_name, cause="write_conflict")
+        self.abort()
 
-        # Update last commit times for the variables we wrote
-        for variable_name in self.variables_write:
-            self.manager.last_commits[variable_name] = self.manager.time
+    def mark_committed(self):
+        self.manager.events.emit("commit", "{transaction} commits", transaction=self.name)
 
-        return self.sites_snapshot
+        # Update last commit times for the variables we wrote
+        for variable in self.write_buffer:
+            self.manager.last_commits[variable] = self.manager.time
+        self.commit_time = self.manager.time
+
+    # Graph-based SSI: returns False if an edge added for this transaction closes a cycle with two consecutive RW edges
+    def add_graph_edges(self):
+        symbols = self.manager.symbols
+        events = self.manager.events
+        for txn, edge_type in self.graph_edges():
+            if self.manager.serialization_graph.add_edge(txn, self.transaction_id, edge_type):
+                events.emit("edge", "Added {edge_type} edge from {source} to {target}",
+                            edge_type=edge_type, source=symbols.transaction_name(txn), target=self.name)
+
+                # Check if adding this Edge creates a cycle in the graph
+                if self.manager.serialization_graph.detect_cycle(txn, self.transaction_id, edge_type):
+                    events.emit("abort_cause", "{transaction} aborts due to cycle in serialization graph",
+                                transaction=self.name, cause="cycle")
+                    self.manager.remove_transaction(self.transaction_id)
+                    self.abort()
+                    return False
+        return True
+
+    # Yields the (transaction, edge type) edges into this transaction that committing it adds to the serialization graph
+    def graph_edges(self):
+        manager = self.manager
+        return commit_edges(self.transaction_id, self.write_buffer, self.variables_read,
+                            manager.overall_writes.accessors, manager.overall_reads.accessors, manager.time)
+
+    # Cahill-style SSI: marks the rw-antidependencies from concurrent readers of our writes and
+    # returns False if that leaves a pivot with both an incoming and an outgoing one
+    def check_conflict_flags(self):
+        events = self.manager.events
+        for var in self.write_buffer:
+            for txn, timestamp in self.manager.overall_reads.accessors(var):
+                reader = self.manager.find_transaction(txn)
+                if txn == self.transaction_id or reader is None or not reader.is_concurrent_with(self):
+                    continue
+                reader.out_conflict = True
+                self.in_conflict = True
+                events.emit("rw_conflict", "Marked RW conflict from {source} to {target}",
+                            source=self.manager.symbols.transaction_name(txn), target=self.name)
+                if reader.in_conflict:
+                    events.emit("abort_cause", "{transaction} aborts due to dangerous structure with pivot {pivot}",
+                                transaction=self.name, pivot=self.manager.symbols.transaction_name(txn), cause="dangerous_structure")
+                    self.abort()
+                    return False
+
+        if self.in_conflict and self.out_conflict:
+            events.emit("abort_cause", "{transaction} aborts due to dangerous structure with pivot {pivot}",
+                        transaction=self.name, pivot=self.name, cause="dangerous_structure")
+            self.abort()
+            return False
+        return True
+
+    # Called when we read variable: a concurrent transaction that already committed a newer
+    # version of it gives an rw-antidependency from us to that writer
+    def mark_read_conflicts(self, variable):
+        for txn, timestamp in self.manager.overall_writes.accessors(variable):
+            writer = self.manager.committed_transactions.get(txn)
+            if txn == self.transaction_id or writer is None or not writer.is_concurrent_with(self):
+                continue
+            self.out_conflict = True
+            writer.in_conflict = True
+            self.manager.events.emit("rw_conflict", "Marked RW conflict from {source} to {target}",
+                                     source=self.name, target=self.manager.symbols.transaction_name(txn))
+            if writer.out_conflict:
+                # The writer is a committed pivot, so we are the only one left to abort
+                self.manager.events.emit("abort_cause", "{transaction} aborts due to dangerous structure with pivot {pivot}",
+                                         transaction=self.name, pivot=self.manager.symbols.transaction_name(txn), cause="dangerous_structure")
+                self.manager.abort_transaction(self.transaction_id)
+                return
+
+    def is_concurrent_with(self, other):
+        # Still running, or committed after the other transaction took its snapshot
+        return self.commit_time is None or self.commit_time > other.start_time
     
     def abort(self):
         self.is_active = False
-        print(f"{self.transaction_id} aborts")
+        self.manager.events.emit("abort", "{transaction} aborts", transaction=self.name)
 
     def __repr__(self):
-        return f"Transaction {self.transaction_id}"
+        return f"Transaction {self.name}"
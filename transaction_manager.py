@@ -1,178 +1,509 @@
-from sites import Site
+from sites import Site, VALUE_MIN, VALUE_MAX
+from topology import Topology
 from transaction import Transaction
-import copy
+from access_registry import AccessRegistry
+from serialization_graph import SerializationGraph
+from symbols import SymbolTable
+from watermark import WatermarkTracker
+from vacuum import VersionVacuum
+from concurrency_control import CONCURRENCY_CONTROLS
+from stats import TransactionStats
+from commands import CommandParser, BEGIN, READ, WRITE, END, DUMP, FAIL, RECOVER, ERROR
+from events import TextSink
+from collections import deque
 
 class TransactionManager:
-    def __init__(self):
-        self.sites = {i: Site(i) for i in range(1, 11)}  # Sites 1 to 10
+    SSI_MODES = ("graph", "flags")
+    WRITE_CONFLICT_MODES = ("commit", "abort", "flag")
+
+    def __init__(self, ssi_mode="graph", topology=None, vacuum=None, write_conflicts="commit", group_commit=0, validator=None,
+                 concurrency="ssi", events=None):
+        # concurrency selects the strategy from CONCURRENCY_CONTROLS: "si", "ssi", "2pl" or "occ".
+        # Under "ssi", "graph" searches the serialization graph for cycles with two consecutive RW edges,
+        # "flags" aborts on Cahill-style pivots with both an incoming and an outgoing RW conflict
+        if ssi_mode not in self.SSI_MODES:
+            raise ValueError(f"Unknown SSI mode: {ssi_mode}")
+        # Writing a variable that a concurrent transaction already committed is only caught at commit
+        # with "commit"; "abort" aborts the writer right away and "flag" marks it as doomed
+        if write_conflicts not in self.WRITE_CONFLICT_MODES:
+            raise ValueError(f"Unknown write conflict mode: {write_conflicts}")
+        if concurrency not in CONCURRENCY_CONTROLS:
+            raise ValueError(f"Unknown concurrency control: {concurrency}")
+        if write_conflicts != "commit" and not CONCURRENCY_CONTROLS[concurrency].first_committer_wins:
+            # 2PL and OCC have no first-committer-wins check for an early one to stand in for
+            raise ValueError(f"write_conflicts={write_conflicts!r} needs a snapshot isolation concurrency control, not {concurrency!r}")
+        # Everything the manager reports goes to an EventSink, printed as text by default
+        self.events = events if events is not None else TextSink()
+        self.events.attach(self)
+        self.concurrency = CONCURRENCY_CONTROLS[concurrency](self)
+        self.stats = TransactionStats() # throughput, latency and abort rate
+        self.ssi_mode = ssi_mode
+        self.write_conflicts = write_conflicts
+        # With group_commit > 0, end() commands are validated and applied together by flush_commits,
+        # once group_commit of them are pending or a command other than end() arrives
+        self.group_commit = group_commit
+        self.commit_batch = [] # transactions that ended and wait for the group commit
+        self.validator = validator # optional ValidationScheduler validating a batch's disjoint groups in parallel
+        self.topology = topology if topology is not None else Topology() # 10 sites and 20 variables by default
+        self.symbols = SymbolTable() # transaction and variable names are interned to ints by process_command
+        self.parser = CommandParser(self.symbols) # compiles command lines, caching repeated ones
+        self.dispatch = {BEGIN: self.begin_transaction, READ: self.read, WRITE: self.write, END: self.end_transaction,
+                         DUMP: self.dump, FAIL: self.fail_site, RECOVER: self.recover_site, ERROR: self.report_error}
+        self.sites = {i: Site(i, self.topology) for i in range(1, self.topology.num_sites + 1)}
         # for site in self.sites.values():
         #     site.commitTime = 0
         # for site in self.sites.values():
         #    site.failTime = []
         self.transactions = {}  
+        self.active_watermark = WatermarkTracker() # earliest start_time among self.transactions
+        self.active_read_write = set() # ids of the active transactions that are not read-only
+        self.safe_snapshot_time = 0 # last time no read-write transaction was active
+        self.deferred_transactions = {} # Dict of id to deferrable read-only transaction waiting for a safe snapshot
+        self.committed_transactions = {} # Dict of transaction id to committed transaction, until garbage collected
+        self.commit_order = deque() # (transaction id, transaction) pairs in commit order, for garbage collection
         self.time = 0
         self.last_commits = {}  
-        self.serialization_graph = {} # Adj list
-        self.overall_reads = {} # Dict of variable name to list of transactions that read it
-        self.overall_writes = {} # Dict of variable name to list of transactions that write it
-        self.waiting_transactions = {} # Dict of variable name to list of transactions that are waiting for it
+        self.serialization_graph = SerializationGraph(self.symbols.transaction_name, self.events) # (src, dst) edges with an edge type bitmask
+        self.overall_reads = AccessRegistry() # variable -> transactions that read it, with their first read time
+        self.overall_writes = AccessRegistry() # variable -> transactions that write it, with their first write time
+        self.waiting_transactions = {} # Dict of site id to list of (transaction, variable, site id) reads waiting for it
+        self.vacuum = vacuum if vacuum is not None else VersionVacuum() # reclaims site versions no snapshot can read
         self.verbose = False
 
-    def begin_transaction(self, transaction_id):
-        transaction = Transaction(transaction_id, self.time, self.sites, self)
+    def begin_transaction(self, transaction_id, read_only=False, deferrable=False):
+        """
+        Starts a transaction with a snapshot at the current time.
+
+        A read-only transaction instead reads the latest safe snapshot: the last time no read-write
+        transaction was active. Every read-write transaction then either committed before that snapshot
+        or started after it, so no dangerous structure can pass through the reader. It is kept out of
+        overall_reads and the serialization graph and is never aborted by validation.
+
+        A deferrable read-only transaction takes its snapshot at the current time and holds its
+        operations until the read-write transactions active at that time have finished, see
+        release_safe_snapshots.
+
+        Args:
+            transaction_id (int): The ID of the transaction to begin.
+            read_only (bool): Begin a read-only transaction on the latest safe snapshot.
+            deferrable (bool): With read_only, wait for the current snapshot to be proven safe instead.
+
+        Raises:
+            ValueError: If deferrable is set without read_only; a read-write transaction would wait on itself.
+        """
+        if deferrable and not read_only:
+            raise ValueError(f"Only a read-only transaction can be deferrable: {self.symbols.transaction_name(transaction_id)}")
+        self.active_read_write.discard(transaction_id)
+        if read_only and deferrable:
+            transaction = Transaction(transaction_id, self.time, self.sites, self, read_only=True)
+        elif read_only:
+            snapshot_time = self.time if not self.active_read_write else self.safe_snapshot_time
+            transaction = Transaction(transaction_id, snapshot_time, self.sites, self, read_only=True)
+        else:
+            transaction = Transaction(transaction_id, self.time, self.sites, self)
+            self.active_read_write.add(transaction_id)
         self.transactions[transaction_id] = transaction
-        print(f"{transaction_id} begins")
-
-    def detect_cycle(self):
-        visited = {}
-
-        def dfs(txn, path, edge_types):
-            visited[txn] = 'gray'
-            path.append(txn)
-
-            for neighbor, edge_type in self.serialization_graph.get(txn, []):
-                if neighbor not in visited:
-                    # Continue DFS traversal
-                    if dfs(neighbor, path, edge_types + [edge_type]):
-                        return True
-                elif visited[neighbor] == 'gray':
-                    # Cycle detected: extract the cycle path
-                    cycle_start_index = path.index(neighbor)
-                    cycle_edge_types = edge_types[cycle_start_index:]
-                    cycle_edge_types.append(edge_type)  # Include the closing edge
-
-                    # Debugging: Print the cycle and its edge types
-                    cycle_path = path[cycle_start_index:] + [neighbor]
-                    print(f"Cycle detected: {' -> '.join(cycle_path)} with edge types {cycle_edge_types}")
-
-                    # Check for two consecutive 'RW' edges, including wrap-around
-                    for i in range(len(cycle_edge_types)):
-                        current_edge = cycle_edge_types[i]
-                        next_edge = cycle_edge_types[(i + 1) % len(cycle_edge_types)]
-                        if current_edge == 'RW' and next_edge == 'RW':
-                            print(f"Consecutive 'RW' edges found: {current_edge} -> {next_edge}")
-                            return True  # Problematic cycle detected
-
-            path.pop()
-            visited[txn] = 'black'
-            return False
-
-        for txn in self.serialization_graph:
-            if txn not in visited:
-                if dfs(txn, [], []):
-                    return True  # Problematic cycle found
-
-        return False  # No problematic cycles detected
-    
+        self.stats.begin(transaction_id, self.time)
+        # A read-only snapshot can be older than every active start_time, so it holds back the vacuum too
+        self.active_watermark.add(transaction_id, transaction.start_time)
+        if read_only:
+            self.events.emit("begin", "{transaction} begins read-only with snapshot at time {snapshot}",
+                             transaction=transaction.name, read_only=True, snapshot=transaction.start_time)
+        else:
+            self.events.emit("begin", "{transaction} begins", transaction=transaction.name, read_only=False)
+        if read_only and deferrable and self.active_read_write:
+            self.defer_until_safe(transaction)
+
+    def defer_until_safe(self, transaction):
+        # Waits for the read-write transactions that are active now, the ones the snapshot may not be safe against
+        transaction.safe_snapshot_wait = {txn: self.transactions[txn] for txn in self.active_read_write}
+        self.deferred_transactions[transaction.transaction_id] = transaction
+        waiting_for = ', '.join(sorted(map(self.symbols.transaction_name, transaction.safe_snapshot_wait)))
+        self.events.emit("snapshot_wait", "{transaction} waits for a safe snapshot until {waiting_for} finish",
+                         transaction=transaction.name, waiting_for=waiting_for)
+
+    def has_conflict_out_before(self, transaction, snapshot_time):
+        # True if transaction read a variable that a concurrent transaction wrote and committed at or
+        # before snapshot_time. Such writers stay in committed_transactions while transaction is active.
+        for variable in transaction.variables_read:
+            for txn, timestamp in self.overall_writes.accessors(variable):
+                writer = self.committed_transactions.get(txn)
+                if writer is not None and writer is not transaction and transaction.start_time < writer.commit_time <= snapshot_time:
+                    return True
+        return False
+
+    def release_safe_snapshots(self, finished):
+        """
+        Updates the deferrable read-only transactions waiting on a finished read-write transaction.
+
+        The snapshot of a waiting transaction is unsafe if one of the read-write transactions it waits
+        for commits with an rw-antidependency to a transaction that committed before the snapshot. Then
+        the reader could be part of a dangerous structure, and it takes a new snapshot at the current time.
+        Once all of them have finished without that, the reader runs its held operations with no
+        conflict tracking.
+
+        Args:
+            finished (Transaction): The read-write transaction that committed or aborted.
+        """
+        ready = []
+        for transaction in list(self.deferred_transactions.values()):
+            if transaction.safe_snapshot_wait.get(finished.transaction_id) is not finished:
+                continue
+            del transaction.safe_snapshot_wait[finished.transaction_id]
+            if finished.commit_time is not None and self.has_conflict_out_before(finished, transaction.start_time):
+                self.events.emit("snapshot_unsafe", "{transaction} snapshot at time {snapshot} is unsafe because of {cause}, retaking it at time {retaken}",
+                                 transaction=transaction.name, snapshot=transaction.start_time, cause=finished.name, retaken=self.time)
+                transaction.start_time = self.time
+                self.active_watermark.add(transaction.transaction_id, transaction.start_time)
+                if self.active_read_write:
+                    self.defer_until_safe(transaction)
+                    continue
+            elif transaction.safe_snapshot_wait:
+                continue
+            ready.append(transaction)
+
+        for transaction in ready:
+            del self.deferred_transactions[transaction.transaction_id]
+            transaction.safe_snapshot_wait = None
+            self.events.emit("snapshot_safe", "{transaction} snapshot at time {snapshot} is safe",
+                             transaction=transaction.name, snapshot=transaction.start_time)
+            operations, transaction.deferred_operations = transaction.deferred_operations, []
+            for operation, variable in operations:
+                if operation == "R":
+                    self.read(transaction.transaction_id, variable)
+                else:
+                    self.end_transaction(transaction.transaction_id, self.sites)
+
+    def find_transaction(self, transaction_id):
+        # Active or committed transaction with this id, None if it aborted or never began
+        if transaction_id in self.transactions:
+            return self.transactions[transaction_id]
+        return self.committed_transactions.get(transaction_id)
+
     def remove_transaction(self, txn_id):
         """
         Removes a transaction and all its edges (both incoming and outgoing) from the serialization graph.
 
         Args:
-            txn_id (str): The ID of the transaction to be removed.
+            txn_id (int): The ID of the transaction to be removed.
         """
-        # Remove all outgoing edges from txn_id
-        if txn_id in self.serialization_graph:
-            del self.serialization_graph[txn_id]
-            print(f"Removed transaction {txn_id} and its outgoing edges from the serialization graph.")
-
-        # Remove all incoming edges to txn_id
-        transactions_to_update = []
-        for txn, edges in self.serialization_graph.items():
-            # Filter out edges that point to txn_id
-            original_edge_count = len(edges)
-            self.serialization_graph[txn] = [edge for edge in edges if edge[0] != txn_id]
-            if len(self.serialization_graph[txn]) < original_edge_count:
-                transactions_to_update.append(txn)
+        txn_name = self.symbols.transaction_name(txn_id)
+        had_outgoing, transactions_to_update = self.serialization_graph.remove(txn_id)
+        if had_outgoing:
+            self.events.emit("graph_remove", "Removed transaction {transaction} and its outgoing edges from the serialization graph.",
+                             transaction=txn_name)
 
         if self.verbose:
             if transactions_to_update:
-                print(f"Removed incoming edges to {txn_id} from transactions: {', '.join(transactions_to_update)}.")
+                self.events.emit("debug", "Removed incoming edges to {transaction} from transactions: {sources}.",
+                                 transaction=txn_name, sources=', '.join(map(self.symbols.transaction_name, transactions_to_update)))
             else:
-                print(f"No incoming edges to {txn_id} were found in the serialization graph.")
+                self.events.emit("debug", "No incoming edges to {transaction} were found in the serialization graph.", transaction=txn_name)
+
+    def oldest_active_start_time(self):
+        # Watermark for garbage collection: the earliest start_time among active transactions, None if there are none
+        return self.active_watermark.oldest()
+
+    def finish_transaction(self, transaction_id):
+        # Removes a committed or aborted transaction from the active ones
+        transaction = self.transactions.pop(transaction_id, None)
+        if transaction is not None:
+            self.active_watermark.remove(transaction_id)
+            self.deferred_transactions.pop(transaction_id, None)
+            self.concurrency.on_finish(transaction)
+            self.stats.finish(transaction_id, self.time, transaction.commit_time is not None)
+            if transaction.commit_time is None and transaction_id not in self.committed_transactions:
+                # Nothing can conflict with an aborted transaction, so its accesses and graph node go right away.
+                # A committed transaction with the same id still owns the records until it is garbage collected.
+                self.overall_reads.remove(transaction_id)
+                self.overall_writes.remove(transaction_id)
+                self.serialization_graph.remove(transaction_id)
+        if transaction_id in self.active_read_write:
+            self.active_read_write.remove(transaction_id)
+            if not self.active_read_write:
+                self.safe_snapshot_time = self.time
+            if self.deferred_transactions:
+                self.release_safe_snapshots(transaction)
+
+    def collect_garbage(self):
+        """
+        Reclaims committed transactions that no active or future transaction can conflict with.
 
-    def read(self, transaction_id, variable_name):
+        A committed transaction is dropped from the serialization graph, overall_reads, overall_writes
+        and committed_transactions once every active transaction started after it committed and none
+        of its predecessors in the graph is still kept. Edges into a transaction are only added when it
+        commits, so after that no new cycle can pass through it.
+
+        Returns:
+            list: The IDs of the reclaimed transactions.
+        """
+        watermark = self.oldest_active_start_time()
+        reclaimed = []
+        progress = True
+        while progress:
+            progress = False
+            blocked = deque()
+            while self.commit_order:
+                txn_id, transaction = self.commit_order[0]
+                if watermark is not None and transaction.commit_time >= watermark:
+                    break
+                self.commit_order.popleft()
+                if self.committed_transactions.get(txn_id) is not transaction or txn_id in self.transactions:
+                    continue  # the id was reused by a later transaction, which owns the records now
+                if any(self.find_transaction(txn) is not None for txn in self.serialization_graph.predecessors(txn_id)):
+                    blocked.append((txn_id, transaction))
+                    continue
+                del self.committed_transactions[txn_id]
+                self.serialization_graph.remove(txn_id)
+                self.overall_reads.remove(txn_id)
+                self.overall_writes.remove(txn_id)
+                reclaimed.append(txn_id)
+                progress = True
+            # Blocked transactions keep their place at the front for the next pass
+            blocked.extend(self.commit_order)
+            self.commit_order = blocked
+
+        if self.verbose and reclaimed:
+            self.events.emit("garbage_collect", "Garbage collected committed transactions: {transactions}",
+                             transactions=', '.join(map(self.symbols.transaction_name, reclaimed)))
+        return reclaimed
+
+    def vacuum_versions(self):
+        # Runs the version vacuum up to the horizon: no snapshot older than the oldest active one
+        # can be taken any more, and a transaction that begins later starts at or after self.time,
+        # or at safe_snapshot_time if it is read-only and read-write transactions are still active
+        horizon = self.oldest_active_start_time()
+        if horizon is None:
+            horizon = self.time
+        if self.active_read_write:
+            horizon = min(horizon, self.safe_snapshot_time)
+        versions, reclaimed_bytes = self.vacuum.maybe_run(horizon)
+        if self.verbose and versions:
+            self.events.emit("vacuum", "Vacuum reclaimed {versions} versions ({bytes} bytes) up to time {horizon}",
+                             versions=versions, bytes=reclaimed_bytes, horizon=horizon)
+        return versions, reclaimed_bytes
+
+    def read(self, transaction_id, variable):
         #Add variable -> transaction mapping to overall reads if the transaction_id is not available already
         #last commit time<site failure time<transaction start time
 
-        if variable_name not in self.overall_reads:
-            self.overall_reads[variable_name] = [(transaction_id, self.time)]
-        else:
-        # Check if transaction_id is already associated with the variable
-            existing_transactions = [entry[0] for entry in self.overall_reads[variable_name]]
-            if transaction_id not in existing_transactions:
-                self.overall_reads[variable_name].append((transaction_id, self.time))
-
+        transaction = self.transactions.get(transaction_id)
+        if transaction is not None and transaction.read_only:
+            if transaction.safe_snapshot_wait is not None:
+                self.events.emit("read_deferred", "{transaction} will read {variable} once its snapshot is safe",
+                                 transaction=transaction.name, variable=self.symbols.variable_name(variable))
+                transaction.deferred_operations.append(("R", variable))
+                return
+            return transaction.read(variable) # safe snapshot: no conflict tracking
 
         if transaction_id not in self.transactions:
-            print(f"{transaction_id} Aborted so not available to read")
+            self.report_inactive(transaction_id, "read")
         else:
-            #print(f"{transaction_id} reads {variable_name}")
-            self.transactions[transaction_id].read(variable_name)
+            self.overall_reads.record(variable, transaction_id, self.time)
+            if not self.concurrency.on_read(self.transactions[transaction_id], variable):
+                return
+            return self.transactions[transaction_id].read(variable)
     
-    def write(self, transaction_id, variable_name, value):
-        #Add variable -> transaction mapping to overall writes if the transaction_id is not available already
-        if variable_name not in self.overall_writes:
-            self.overall_writes[variable_name] = [(transaction_id, self.time)]
-        else:
-            existing_transactions = [entry[0] for entry in self.overall_writes[variable_name]]
-            if transaction_id not in existing_transactions:
-                self.overall_writes[variable_name].append((transaction_id, self.time))
+    def write(self, transaction_id, variable, value):
+        transaction = self.transactions.get(transaction_id)
+        if transaction is not None and transaction.read_only:
+            transaction.write(variable, value) # rejected, and kept out of overall_writes
+            return
 
         if transaction_id not in self.transactions:
-            print(f"{transaction_id} Aborted so not available to write")
+            self.report_inactive(transaction_id, "write")
+            return
+        elif not VALUE_MIN <= value <= VALUE_MAX:
+            # Same check as the parser, for values written through the API (e.g. RetryEngine)
+            self.report_error(f"Invalid write value: {value}")
             return
         else:
+            #Add variable -> transaction mapping to overall writes if the transaction_id is not available already
+            self.overall_writes.record(variable, transaction_id, self.time)
             if self.verbose:
-                print(f"{transaction_id} writes {variable_name} = {value}")
-            self.transactions[transaction_id].write(variable_name, value)
+                self.events.emit("debug", "{transaction} writes {variable} = {value}", transaction=transaction.name,
+                                 variable=self.symbols.variable_name(variable), value=value)
+            if not self.concurrency.on_write(transaction, variable):
+                return
+            self.transactions[transaction_id].write(variable, value)
+
+    def check_write_conflict(self, transaction, variable):
+        """
+        First-updater-wins check at write time, ahead of the first-committer-wins check in Transaction.commit.
 
-    def end_transaction(self, transaction_id, sites):
+        Args:
+            transaction (Transaction): The active transaction writing variable.
+            variable (int): The variable being written.
+
+        Returns:
+            bool: False if the transaction was aborted because a concurrent transaction already committed variable.
+        """
+        if self.last_commits.get(variable, -1) <= transaction.start_time:
+            return True
+        variable_name = self.symbols.variable_name(variable)
+        if self.write_conflicts == "flag":
+            # Keeps running, but the commit check is bound to abort it
+            if transaction.write_conflict is None:
+                transaction.write_conflict = variable
+                self.events.emit("write_conflict", "{transaction} will abort at commit because {variable} was already committed by another transaction after we started",
+                                 transaction=transaction.name, variable=variable_name)
+            return True
+        self.events.emit("abort_cause", "{transaction} aborts because {variable} was already committed by another transaction after we started",
+                         transaction=transaction.name, variable=variable_name, cause="write_conflict")
+        self.abort_transaction(transaction.transaction_id)
+        return False
+
+    def end_transaction(self, transaction_id, sites=None):
+        if sites is None:
+            sites = self.sites
         if transaction_id not in self.transactions:
-            print(f"{transaction_id} Aborted so not available to end")
+            self.report_inactive(transaction_id, "end")
             return
-        print(f"{transaction_id} ends")
-        #if it doesnt return None, then update the sites with the new values it returns
-        mysites_snapshot = self.transactions[transaction_id].commit(sites)
-        if mysites_snapshot:
-            # Merge the changes from the transaction's snapshot into the global sites
-            for site_id, site in mysites_snapshot.items():
-                global_site = self.sites[site_id]
-                #global_site.last_commit = self.time
-                if global_site.is_up:
-                    # Update the variables in the global site with the values from the transaction's snapshot
-                    for variable_name, variable in site.variables.items():
-                        if variable_name in self.transactions[transaction_id].variables_write:
-                            # global_site.commitTime = self.time
-                            global_site.variables[variable_name].value = variable.value
-
-                            #If the commited value is not equal to the already present value in global site then update the commit time with var, commit time
-                            if global_site.variables[variable_name].value != variable.value:
-                                global_site.commitTime[variable_name] = self.time
-                            
-                            print(f"{transaction_id} commits {variable_name} = {variable.value} to Site {site_id}")
-            del self.transactions[transaction_id]
-        else:
-            #remove transaction from the list of transactions
-            del self.transactions[transaction_id]
+        transaction_name = self.symbols.transaction_name(transaction_id)
+        if self.transactions[transaction_id].safe_snapshot_wait is not None:
+            self.events.emit("end_deferred", "{transaction} will end once its snapshot is safe", transaction=transaction_name)
+            self.transactions[transaction_id].deferred_operations.append(("end", None))
+            return
+        self.events.emit("end", "{transaction} ends", transaction=transaction_name)
+        transaction = self.transactions[transaction_id]
+        if self.group_commit and not transaction.read_only:
+            # Validated and applied with the rest of the batch by flush_commits
+            if transaction not in self.commit_batch:
+                self.commit_batch.append(transaction)
+            if len(self.commit_batch) >= self.group_commit:
+                self.flush_commits()
+            return
+        #if it doesnt return None, then install the buffered writes as new versions at the sites
+        if transaction.commit(sites) is not None:
+            self.apply_commits([transaction])
+        #remove transaction from the list of transactions
+        self.finish_transaction(transaction_id)
+        self.collect_garbage()
+        self.vacuum_versions()
         if self.verbose:
-            print("After end transaction database state:")
+            self.events.emit("debug", "After end transaction database state:")
             for site in self.sites.values():
-                print(site)
+                self.events.emit("debug", "{site}", site=site)
+
+    def apply_commits(self, committed):
+        # Installs the buffered writes of the committed transactions in one pass ordered by site and variable.
+        # Only the buffered keys are touched, at the sites that took each write and are still up. The sort is
+        # stable, so when members blindly wrote the same variable (possible under OCC) the last one in batch order wins
+        installs = []
+        for transaction in committed:
+            for variable, value in transaction.write_buffer.items():
+                for site_id in transaction.write_sites[variable]:
+                    if self.sites[site_id].is_up:
+                        installs.append((site_id, variable, value, transaction.name))
+        for site_id, variable, value, transaction_name in sorted(installs, key=lambda install: install[:2]):
+            self.sites[site_id].commit(variable, value, self.time)
+            self.vacuum.track(self.sites[site_id], variable)
+            self.events.emit("install", "{transaction} commits {variable} = {value} to Site {site}", transaction=transaction_name,
+                             variable=self.symbols.variable_name(variable), value=value, site=site_id)
+        for transaction in committed:
+            if not transaction.read_only:
+                self.committed_transactions[transaction.transaction_id] = transaction
+                self.commit_order.append((transaction.transaction_id, transaction))
+
+    def flush_commits(self):
+        """
+        Validates and applies the pending group commit batch together.
+
+        First-committer-wins runs in batch order, so a member that wrote a variable an earlier member
+        also wrote aborts. In graph mode the edges of all members are then added and checked by one
+        SerializationGraph.detect_batch_cycle pass, which is repeated only after a member on a cycle
+        with two consecutive RW edges aborts. The writes of the members that commit are installed in
+        a single merged pass and garbage collection runs once. With a validator, the first-committer-wins
+        checks and edge collection of groups with disjoint write sets run in its pool instead.
+
+        Returns:
+            list: The IDs of the transactions that committed.
+        """
+        batch, self.commit_batch = self.commit_batch, []
+        # Members aborted since their end(), e.g. by a site failure, are gone from self.transactions
+        batch = [transaction for transaction in batch if self.transactions.get(transaction.transaction_id) is transaction]
+        if not batch:
+            return []
+
+        validated = []
+        edges_of = {} # Dict of transaction id to its graph edges, when the validator collected them
+        if self.validator is not None and self.concurrency.batches_graph:
+            # Flags mode updates the flags of other transactions while validating, so it stays serial
+            results = self.validator.validate(batch, self)
+            for transaction in batch:
+                conflict, edges_of[transaction.transaction_id] = results[transaction.transaction_id]
+                if conflict is not None:
+                    transaction.abort_write_conflict(conflict)
+                    continue
+                validated.append(transaction)
+        else:
+            batch_writes = set()
+            for transaction in batch:
+                if self.concurrency.batches_graph:
+                    # Only first-committer-wins here, the graph edges of the whole batch are checked below
+                    if not transaction.check_first_committer(batch_writes):
+                        continue
+                elif not self.concurrency.validate(transaction, batch_writes):
+                    continue
+                batch_writes.update(transaction.write_buffer)
+                validated.append(transaction)
+
+        if self.concurrency.batches_graph:
+            new_edges = []
+            for transaction in validated:
+                edges = edges_of.get(transaction.transaction_id)
+                for txn, edge_type in edges if edges is not None else transaction.graph_edges():
+                    if self.serialization_graph.add_edge(txn, transaction.transaction_id, edge_type):
+                        self.events.emit("edge", "Added {edge_type} edge from {source} to {target}",
+                                         edge_type=edge_type, source=self.symbols.transaction_name(txn), target=transaction.name)
+                        new_edges.append((txn, transaction.transaction_id))
+            while True:
+                edge = self.serialization_graph.detect_batch_cycle(new_edges)
+                if edge is None:
+                    break
+                transaction = self.transactions[edge[1]]
+                self.events.emit("abort_cause", "{transaction} aborts due to cycle in serialization graph",
+                                 transaction=transaction.name, cause="cycle")
+                self.remove_transaction(transaction.transaction_id)
+                transaction.abort()
+                validated.remove(transaction)
+                new_edges = [(src, dst) for src, dst in new_edges if transaction.transaction_id not in (src, dst)]
+
+        for transaction in validated:
+            transaction.mark_committed()
+        self.apply_commits(validated)
+        for transaction in batch:
+            self.finish_transaction(transaction.transaction_id)
+        self.collect_garbage()
+        self.vacuum_versions()
+        if self.verbose:
+            self.events.emit("group_commit", "Group commit of {size} transactions committed {committed}",
+                             size=len(batch), committed=len(validated))
+        return [transaction.transaction_id for transaction in validated]
 
     def abort_transaction(self, transaction_id):
         if transaction_id not in self.transactions:
-            print(f"{transaction_id} Aborted so not available to abort")
+            self.report_inactive(transaction_id, "abort")
             return
-        print(f"{transaction_id} aborts")
+        self.events.emit("abort", "{transaction} aborts", transaction=self.symbols.transaction_name(transaction_id))
         self.transactions[transaction_id].abort()
-        del self.transactions[transaction_id]
+        self.finish_transaction(transaction_id)
+        self.collect_garbage()
+
+    def report_inactive(self, transaction_id, operation):
+        # operation ("read", "write", "end" or "abort") names a transaction that aborted or never began
+        self.events.emit("inactive", "{transaction} Aborted so not available to {operation}",
+                         transaction=self.symbols.transaction_name(transaction_id), operation=operation)
+
+    def report_error(self, message):
+        # Runs the ERROR commands the parser makes of malformed lines
+        self.events.emit("error", "{message}", message=message)
 
     def dump(self):
         # Placeholder for the dump method
-        print("Dumping database state:")
+        self.events.emit("dump", "Dumping database state:")
         for site in self.sites.values():
-            print(site)
+            self.events.emit("site", "{site}", site=site)
          
     def fail_site(self, site_id):
         site = self.sites.get(site_id)
@@ -181,15 +512,15 @@ class TransactionManager:
         # then abort and remove the transaction.
         transactions_to_remove = []
         for transaction in self.transactions.values():
-            for variable_name in transaction.variables_write:
-                print(f"Site {site_id} failed")
-                if variable_name in site.variables:
-                    #print(f"{transaction.transaction_id} aborts because site {site_id} failed")
+            for variable in transaction.write_buffer:
+                self.events.emit("site_fail", "Site {site} failed", site=site_id)
+                if variable in site:
+                    #print(f"{transaction.name} aborts because site {site_id} failed")
                     transaction.abort()
                     transactions_to_remove.append(transaction.transaction_id)
-            transaction.sites_snapshot[site_id].is_up = False
         for transaction_id in transactions_to_remove:
-            del self.transactions[transaction_id]
+            self.finish_transaction(transaction_id)
+        self.collect_garbage()
 
         # Saving the fail time of the site in the FailTime list of the site
         site.failTime.append(self.time)
@@ -197,101 +528,42 @@ class TransactionManager:
         if site:
             site.fail()
         else:
-            print(f"Site {site_id} does not exist")
+            self.events.emit("error", "Site {site} does not exist", site=site_id)
 
     def recover_site(self, site_id):
         site = self.sites.get(site_id)
         if site:
             site.recover()
         else:
-            print(f"Site {site_id} does not exist")
+            self.events.emit("error", "Site {site} does not exist", site=site_id)
 
-        global_site = copy.deepcopy(self.sites[site_id])
-        for transaction in self.transactions.values():
-            transaction.sites_snapshot[site_id] = copy.deepcopy(global_site)
-            transaction.sites_snapshot[site_id].is_up = True
         # Go through waiting transactions and check if they can be read now
         #   waiting_transactions: {2: [('T3', 'x8', 2)]}
-        print(f"Site {site_id} recovered")
-        print(f"Waiting transactions: {self.waiting_transactions}")
+        self.events.emit("site_recover", "Site {site} recovered", site=site_id)
+        if self.events.enabled:
+            waiting = {waiting_site: [(self.symbols.transaction_name(txn), self.symbols.variable_name(variable), i) for txn, variable, i in reads]
+                       for waiting_site, reads in self.waiting_transactions.items()}
+            self.events.emit("waiting", "Waiting transactions: {waiting}", waiting=waiting)
         if site_id in self.waiting_transactions:
-            for transaction_id, variable_name,recovered_site_id in self.waiting_transactions[site_id]:
+            for transaction_id, variable,recovered_site_id in self.waiting_transactions[site_id]:
                 if recovered_site_id == site_id:
-                    self.read(transaction_id, variable_name) 
+                    self.read(transaction_id, variable) 
 
     def process_command(self, command):
-        if '//' in command:
-            command = command.split('//', 1)[0].strip()
+        # Lines are compiled once by self.parser (names interned to ints) and run through the dispatch table
+        parsed = self.parser.parse(command)
 
         # If after removing comments the line is empty, just return
-        if not command:
+        if parsed is None:
             return
         
         self.time += 1
-        command = command.strip()
-
-        # Handle begin(T1)
-        if command.startswith('begin(') and command.endswith(')'):
-            transaction_id = command[6:-1]
-            self.begin_transaction(transaction_id)
-            return
+        self.execute(parsed)
 
-        # Handle R(T1, x2)
-        elif command.startswith('R(') and command.endswith(')'):
-            inside = command[2:-1]  # Extract the content inside parentheses
-            parts = [part.strip() for part in inside.split(',')]
-            if len(parts) == 2:
-                transaction_id, variable_name = parts
-                self.read(transaction_id, variable_name)
-            else:
-                print(f"Invalid read command: {command}")
-            return
-
-        # Handle W(T1, x2, 100)
-        elif command.startswith('W(') and command.endswith(')'):
-            inside = command[2:-1]
-            parts = [part.strip() for part in inside.split(',')]
-            if len(parts) == 3:
-                transaction_id, variable_name, value = parts
-                try:
-                    value = int(value)
-                    self.write(transaction_id, variable_name, value)
-                except ValueError:
-                    print(f"Invalid write value: {value}")
-            else:
-                print(f"Invalid write command: {command}")
-            return
-
-        # Handle end(T1)
-        elif command.startswith('end(') and command.endswith(')'):
-            transaction_id = command[4:-1]
-            self.end_transaction(transaction_id, self.sites)
-            return
+    def execute(self, command):
+        # Runs a compiled Command at the current time; process_command and binary trace replay both end up here
+        # A command other than end() closes the current group commit batch
+        if self.commit_batch and command.opcode != END:
+            self.flush_commits()
 
-        # Handle dump()
-        elif command == 'dump()':
-            self.dump()
-            return
-
-        # Handle fail(2)
-        elif command.startswith('fail(') and command.endswith(')'):
-            site_id_str = command[5:-1]
-            try:
-                site_id = int(site_id_str)
-                self.fail_site(site_id)
-            except ValueError:
-                print(f"Invalid site id: {site_id_str}")
-            return
-
-        # handle recover(2)
-        elif command.startswith('recover(') and command.endswith(')'):
-            site_id_str = command[8:-1]
-            try:
-                site_id = int(site_id_str)
-                self.recover_site(site_id)
-            except ValueError:
-                print(f"Invalid site id: {site_id_str}")
-            return
-
-        else:
-            print(f"Unknown command: {command}")
+        self.dispatch[command.opcode](*command.args)
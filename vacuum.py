@@ -0,0 +1,102 @@
+import sys
+from collections import deque
+
+class VersionVacuum:
+    """
+    Discards superseded versions in Site.history that no active or future snapshot can read.
+
+    A snapshot taken at start_time reads the newest version committed at or before it, so once every
+    active transaction started at or after the horizon, only the newest version committed at or before
+    the horizon and the ones after it are still reachable. Slots that gained history are queued and
+    each run examines at most `budget` of them, so the work done per commit stays bounded.
+
+    Args:
+        budget (int): Slots examined per run, None to sweep the whole queue every time.
+        interval (int): Run once every `interval` calls to maybe_run().
+    """
+    def __init__(self, budget=64, interval=1):
+        if budget is not None and budget < 1:
+            raise ValueError(f"Vacuum budget must be positive: {budget}")
+        if interval < 1:
+            raise ValueError(f"Vacuum interval must be positive: {interval}")
+        self.budget = budget
+        self.interval = interval
+        self.pending = deque() # (site, slot) pairs that may hold unreachable history
+        self.queued = set() # (site id, slot) pairs already in pending
+        self.calls = 0
+        self.runs = 0
+        self.reclaimed_versions = 0
+        self.reclaimed_bytes = 0 # approximate, from sys.getsizeof of the version tuples
+
+    def track(self, site, variable):
+        # Called after a commit to site pushed the previous version of variable into its history
+        slot = site.slot_of(variable)
+        key = (site.site_id, slot)
+        if key not in self.queued:
+            self.queued.add(key)
+            self.pending.append((site, slot))
+
+    def maybe_run(self, horizon):
+        self.calls += 1
+        if self.calls % self.interval:
+            return 0, 0
+        return self.run(horizon)
+
+    def run(self, horizon):
+        """
+        Prunes the history of up to `budget` queued slots.
+
+        Args:
+            horizon (int): Earliest start_time any active or future transaction can have.
+
+        Returns:
+            tuple: (versions, bytes) reclaimed by this run.
+        """
+        self.runs += 1
+        versions = reclaimed_bytes = 0
+        remaining = len(self.pending) if self.budget is None else min(self.budget, len(self.pending))
+        for _ in range(remaining):
+            site, slot = self.pending.popleft()
+            dropped = self.prune(site, slot, horizon)
+            versions += len(dropped)
+            reclaimed_bytes += sum(self.version_size(version) for version in dropped)
+            if slot in site.history:
+                self.pending.append((site, slot)) # still holds versions, look again on a later run
+            else:
+                self.queued.discard((site.site_id, slot))
+        self.reclaimed_versions += versions
+        self.reclaimed_bytes += reclaimed_bytes
+        return versions, reclaimed_bytes
+
+    def prune(self, site, slot, horizon):
+        # Returns the dropped versions of slot; the history entry is deleted once it is empty
+        older = site.history.get(slot)
+        if not older:
+            site.history.pop(slot, None)
+            return []
+        if site.commit_times[slot] <= horizon:
+            keep_from = len(older) # the column version already covers every snapshot from the horizon on
+        else:
+            # Keep the newest history version committed at or before the horizon
+            keep_from = 0
+            for i in range(len(older) - 1, -1, -1):
+                if older[i][0] <= horizon:
+                    keep_from = i
+                    break
+        dropped = older[:keep_from]
+        if keep_from == len(older):
+            del site.history[slot]
+        elif keep_from:
+            del older[:keep_from]
+        return dropped
+
+    @staticmethod
+    def version_size(version):
+        return sys.getsizeof(version) + sys.getsizeof(version[0]) + sys.getsizeof(version[1])
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __repr__(self):
+        return (f"VersionVacuum(budget={self.budget}, interval={self.interval}, pending={len(self.pending)}, "
+                f"reclaimed_versions={self.reclaimed_versions}, reclaimed_bytes={self.reclaimed_bytes})")
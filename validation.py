@@ -0,0 +1,218 @@
+import multiprocessing
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+from access_registry import AccessRegistry
+
+
+def commit_edges(transaction_id, written, read, writes_of, reads_of, now):
+    """
+    Yields the (transaction, edge type) edges into transaction_id that committing it adds to the serialization graph.
+
+    Args:
+        transaction_id (int): The committing transaction.
+        written (iterable): Variables it wrote.
+        read (iterable): Variables it read.
+        writes_of (callable): Variable -> (transaction, first write time) pairs, oldest first.
+        reads_of (callable): Variable -> (transaction, first read time) pairs, oldest first.
+        now (int): The commit time.
+    """
+    for var in written:
+        for txn, timestamp in writes_of(var):
+            if txn != transaction_id and timestamp < now:
+                yield txn, "WW"
+        for txn, timestamp in reads_of(var):
+            if txn != transaction_id and timestamp < now:
+                yield txn, "RW"
+
+    for var in read:
+        for txn, timestamp in writes_of(var):
+            if txn != transaction_id and timestamp > now:
+                yield txn, "WR"
+
+
+def validate_groups(groups, last_commits, writes_of, reads_of, now):
+    # First-committer-wins and edge collection for groups of (id, start_time, written, read) members.
+    # Returns (id, conflicting variable or None, edges) per member, with duplicate edges dropped.
+    results = []
+    for group in groups:
+        batch_writes = set()
+        for txn_id, start_time, written, read in group:
+            conflict = next((var for var in written if last_commits.get(var, -1) > start_time or var in batch_writes), None)
+            if conflict is not None:
+                results.append((txn_id, conflict, []))
+                continue
+            batch_writes.update(written)
+            # A repeated (transaction, edge type) pair adds nothing to the graph, so it is not sent back
+            edges = list(dict.fromkeys(commit_edges(txn_id, written, read, writes_of, reads_of, now)))
+            results.append((txn_id, None, edges))
+    return results
+
+
+def replica_worker(connection):
+    # Runs in a worker process: keeps replicas of the manager's access registries, updated with the changes
+    # sent before every task, and validates its share of each batch against them
+    writes, reads = AccessRegistry(), AccessRegistry()
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        changes, task = message
+        reset, write_changes, read_changes = pickle.loads(changes)
+        if reset:
+            writes, reads = AccessRegistry(), AccessRegistry()
+        writes.replay(write_changes)
+        reads.replay(read_changes)
+        if task is not None:
+            groups, last_commits, now = task
+            connection.send(validate_groups(groups, last_commits, writes.accessors, reads.accessors, now))
+
+
+class ValidationScheduler:
+    """
+    Validates a group commit batch in parallel, see TransactionManager.flush_commits.
+
+    The batch is partitioned into groups of transactions whose write sets overlap, transitively.
+    First-committer-wins only relates transactions that wrote a common variable, and the access
+    registries read to collect graph edges do not change during a flush, so groups can be validated
+    independently. Groups are spread over `workers` tasks. Adding the edges, the cycle analysis and
+    installing the writes stay serial.
+
+    Thread workers read the manager's registries directly. Process workers each keep a replica of them:
+    the first flush ships the registries once, later flushes only the accesses recorded and removed since
+    the previous one, so a task carries no more than its members' footprints.
+
+    Args:
+        workers (int): Number of pool workers.
+        executor (str): "thread" or "process".
+    """
+    EXECUTORS = ("thread", "process")
+
+    def __init__(self, workers=4, executor="thread"):
+        if executor not in self.EXECUTORS:
+            raise ValueError(f"Unknown executor: {executor}")
+        if workers < 1:
+            raise ValueError(f"Number of workers must be positive: {workers}")
+        self.workers = workers
+        self.executor = executor
+        self.pool = None # ThreadPoolExecutor, created on first use
+        self.connections = [] # pipes to the process workers, started on first use
+        self.processes = []
+        self.manager = None # manager whose registries the process replicas follow
+
+    def partition(self, batch):
+        # Union-find over written variables; groups keep the batch order of their members
+        parent = {}
+
+        def find(var):
+            while parent.setdefault(var, var) != var:
+                parent[var] = parent[parent[var]]
+                var = parent[var]
+            return var
+
+        for transaction in batch:
+            written = iter(transaction.write_buffer)
+            first = next(written, None)
+            for var in written:
+                parent[find(var)] = find(first)
+
+        groups = {}
+        for transaction in batch:
+            key = find(next(iter(transaction.write_buffer))) if transaction.write_buffer else ("txn", transaction.transaction_id)
+            groups.setdefault(key, []).append(transaction)
+        return list(groups.values())
+
+    def validate(self, batch, manager):
+        """
+        Args:
+            batch (list): Transactions of the batch, in batch order.
+            manager (TransactionManager): Manager holding last_commits, overall_writes and overall_reads.
+
+        Returns:
+            dict: Transaction id to (conflicting variable or None, list of (transaction, edge type) edges).
+        """
+        groups = self.partition(batch)
+        tasks = [[] for _ in range(min(self.workers, len(groups)))]
+        for i, group in enumerate(sorted(groups, key=len, reverse=True)):
+            tasks[i % len(tasks)].append(group)
+        tasks = [self.footprints(task) for task in tasks]
+
+        results = {}
+        if len(tasks) == 1:
+            # A single task is not worth a trip through the pool
+            outcomes = [validate_groups(tasks[0], manager.last_commits, manager.overall_writes.accessors,
+                                        manager.overall_reads.accessors, manager.time)]
+            if self.connections:
+                self.sync(manager) # keeps the replicas' change logs short
+        elif self.executor == "thread":
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.workers)
+            futures = [self.pool.submit(validate_groups, task, manager.last_commits, manager.overall_writes.accessors,
+                                        manager.overall_reads.accessors, manager.time) for task in tasks]
+            outcomes = [future.result() for future in futures]
+        else:
+            self.sync(manager, [(task, self.last_commits_of(task, manager), manager.time) for task in tasks])
+            outcomes = [connection.recv() for connection in self.connections[:len(tasks)]]
+        for outcome in outcomes:
+            results.update((txn, (conflict, edges)) for txn, conflict, edges in outcome)
+        return results
+
+    @staticmethod
+    def footprints(task):
+        # (id, start_time, written, read) of the members of each group of a task
+        return [[(transaction.transaction_id, transaction.start_time, list(transaction.write_buffer), list(transaction.variables_read))
+                 for transaction in group] for group in task]
+
+    @staticmethod
+    def last_commits_of(task, manager):
+        # The last_commits entries first-committer-wins reads for a task: those of the variables it writes
+        last_commits = manager.last_commits
+        return {var: last_commits[var] for group in task for _, _, written, _ in group for var in written if var in last_commits}
+
+    def sync(self, manager, tasks=()):
+        """
+        Brings the process replicas up to date with manager and hands out tasks.
+
+        The changes are pickled once and sent to every worker, the i-th worker gets the i-th task if any.
+        Switching to another manager rebuilds the replicas from its registries.
+
+        Args:
+            manager (TransactionManager): The manager whose registries are replicated.
+            tasks (list): (groups, last_commits, now) tasks, at most one per worker.
+        """
+        if not self.connections:
+            context = multiprocessing.get_context()
+            for _ in range(self.workers):
+                parent, child = context.Pipe()
+                process = context.Process(target=replica_worker, args=(child,), daemon=True)
+                process.start()
+                self.connections.append(parent)
+                self.processes.append(process)
+        if manager is not self.manager:
+            if self.manager is not None:
+                self.manager.overall_writes.unfollow()
+                self.manager.overall_reads.unfollow()
+            self.manager = manager
+            changes = (True, manager.overall_writes.follow(), manager.overall_reads.follow())
+        else:
+            changes = (False, manager.overall_writes.take_changes(), manager.overall_reads.take_changes())
+        changes = pickle.dumps(changes, pickle.HIGHEST_PROTOCOL)
+        for i, connection in enumerate(self.connections):
+            connection.send((changes, tasks[i] if i < len(tasks) else None))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        for connection in self.connections:
+            connection.send(None)
+        for process in self.processes:
+            process.join()
+        self.connections, self.processes = [], []
+        if self.manager is not None:
+            self.manager.overall_writes.unfollow()
+            self.manager.overall_reads.unfollow()
+            self.manager = None
+
+    def __repr__(self):
+        return f"ValidationScheduler(workers={self.workers}, executor={self.executor!r})"
@@ -0,0 +1,35 @@
+import heapq
+
+class WatermarkTracker:
+    # Tracks the earliest start_time among active transactions.
+    # A min-heap of (start_time, transaction id) with lazy deletion: finished transactions are only
+    # dropped when they reach the top, so add/remove are O(log n) amortized and oldest() is O(1).
+    def __init__(self):
+        self.heap = []
+        self.active = {} # Dict of active transaction id to its start_time
+
+    def add(self, transaction_id, start_time):
+        # A reused id replaces the earlier entry, which becomes stale
+        self.active[transaction_id] = start_time
+        heapq.heappush(self.heap, (start_time, transaction_id))
+        self.discard_stale()
+
+    def remove(self, transaction_id):
+        if self.active.pop(transaction_id, None) is not None:
+            self.discard_stale()
+
+    def discard_stale(self):
+        # Keep a live entry on top so oldest() never has to skip anything
+        while self.heap and self.active.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        # Rebuild once stale entries buried in the heap outnumber the live ones
+        if len(self.heap) > 2 * len(self.active) + 16:
+            self.heap = [(start_time, txn) for txn, start_time in self.active.items()]
+            heapq.heapify(self.heap)
+
+    def oldest(self):
+        # Earliest start_time of an active transaction, None if there are none
+        return self.heap[0][0] if self.heap else None
+
+    def __len__(self):
+        return len(self.active)